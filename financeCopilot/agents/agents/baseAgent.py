@@ -1,36 +1,138 @@
 import os, json
-import google.generativeai as genai
+import time
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
+from agents.llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE
+from agents.llm_metrics import llm_metrics
+
 api_key = os.getenv("GEMINI_API_KEY")
+
+# Kalıcı önbellekler (konuşma geçmişi vb.) bu klasörde tutulur
+AGENT_CACHE_DIR = os.getenv("AGENT_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"))
+
+
+def cache_path(filename):
+    os.makedirs(AGENT_CACHE_DIR, exist_ok=True)
+    return os.path.join(AGENT_CACHE_DIR, filename)
+
+
+DEFAULT_MODEL_NAME = "gemini-2.0-flash"
+
+JSON_GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+    "response_mime_type": "application/json",
+}
+
+# Model nesneleri (model adı, generation config, system instruction) anahtarıyla
+# ilk kullanımda oluşturulur ve tüm ajanlar arasında paylaşılır.
+_model_registry = {}
+_registry_lock = threading.Lock()
+_genai_configured = False
+
+
+def configure_genai():
+    global _genai_configured
+    if not _genai_configured:
+        with _registry_lock:
+            if not _genai_configured:
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                _genai_configured = True
+
+
+def _config_key(generation_config):
+    return tuple(sorted((generation_config or {}).items()))
+
+
+def get_model(model_name=DEFAULT_MODEL_NAME, generation_config=None, system_instruction=None):
+    key = (model_name, _config_key(generation_config), system_instruction)
+    model = _model_registry.get(key)
+    if model is None:
+        configure_genai()
+        with _registry_lock:
+            model = _model_registry.get(key)
+            if model is None:
+                import google.generativeai as genai
+                model = genai.GenerativeModel(
+                    model_name=model_name,
+                    generation_config=dict(generation_config) if generation_config else None,
+                    system_instruction=system_instruction,
+                )
+                _model_registry[key] = model
+    return model
+
+
+def _record_call(agent, model, started, response=None, error=None):
+    model_name = getattr(model, "model_name", DEFAULT_MODEL_NAME).replace("models/", "")
+    latency = time.perf_counter() - started
+    if error is not None:
+        outcome = "rate_limited" if getattr(error, "code", None) == 429 or "429" in str(error) else "error"
+        llm_metrics.record(agent, model_name, outcome, latency)
+        return
+    usage = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    cost = Agent.calculate_token_cost(input_tokens, output_tokens)
+    llm_metrics.record(agent, model_name, "success", latency, input_tokens, output_tokens, cost["total_cost_usd"])
+
+
+# Zamanlayıcıdan geçen her model çağrısı gecikme, token, maliyet ve sonuç olarak /metrics'e yazılır
+def call_llm(model, prompt, agent="unknown", priority=PRIORITY_INTERACTIVE, on_chunk=None):
+    started = time.perf_counter()
+    try:
+        response = llm_scheduler.generate(model, prompt, priority=priority, on_chunk=on_chunk)
+    except Exception as e:
+        _record_call(agent, model, started, error=e)
+        raise
+    _record_call(agent, model, started, response)
+    return response
+
+
+async def call_llm_async(model, prompt, agent="unknown", priority=PRIORITY_INTERACTIVE, on_chunk=None):
+    started = time.perf_counter()
+    try:
+        response = await llm_scheduler.generate_async(model, prompt, priority=priority, on_chunk=on_chunk)
+    except Exception as e:
+        _record_call(agent, model, started, error=e)
+        raise
+    _record_call(agent, model, started, response)
+    return response
+
+
 class Agent:
+    model_name = DEFAULT_MODEL_NAME
+    generation_config = JSON_GENERATION_CONFIG
+
     def __init__(self, name, role):
         self.name = name
         self.role = role
-        generation_config = {
-            "temperature": 0.3,
-            "top_p": 0.95,
-            "top_k": 64,
-            "max_output_tokens": 8192,
-            "response_mime_type": "application/json",
-        }
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config=generation_config,
-            system_instruction=role,
-        )
-        chat = self.model.start_chat(history=[])
-        self.chat=chat
 
+    # Model, rol metni system instruction olarak kullanılarak kayıt defterinden tembel alınır
+    @property
+    def model(self):
+        return get_model(self.model_name, self.generation_config, self.role)
 
-    def generate_response(self, prompt):
+    def generate_response(self, prompt, on_chunk=None):
         print(f"📝 Prompt sent to {self.name}:\n{prompt[:500]}...")
-        response = self.model.generate_content(prompt)
+        response = self.call_model(prompt, on_chunk=on_chunk)
         print(f"🧾 Raw response from {self.name}:\n{response.text[:500]}...")
         return response.text.strip()
 
+    # Tüm model çağrıları süreç genelindeki zamanlayıcıdan geçer (hız sınırı, eşzamanlılık, yeniden deneme)
+    # ve ajan sınıfı adıyla ölçülür.
+    # on_chunk verilirse yanıt stream=True ile alınır ve her parça metni geldikçe iletilir.
+    # Dönen response tamamlanmış haldedir (.text ve usage_metadata kullanılabilir).
+    def call_model(self, prompt, model=None, on_chunk=None, priority=PRIORITY_INTERACTIVE):
+        return call_llm(model or self.model, prompt, type(self).__name__, priority, on_chunk)
+
+    async def call_model_async(self, prompt, model=None, on_chunk=None, priority=PRIORITY_INTERACTIVE):
+        return await call_llm_async(model or self.model, prompt, type(self).__name__, priority, on_chunk)
+
     # ➕ Token bazlı maliyet hesaplama fonksiyonu
     @staticmethod
     def calculate_token_cost(input_tokens, output_tokens):
@@ -0,0 +1,160 @@
+import os
+import asyncio
+from collections import Counter
+
+from agents.orcestratorAgent import agents
+from agents.job_tracking import job_status, resolve_job_id
+from agents.conversation_memory import user_key_from_form
+from agents.ingestion_index import transaction_fingerprint
+from agents.money import format_minor, totals_by
+
+# Birden fazla ekstre orkestratöre uğramadan doğrudan ExpenseAnalyzerAgent'a gider
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "24"))
+# Süreç genelinde aynı anda analiz edilen ekstre sayısı (tüm batch istekleri paylaşır)
+BATCH_ANALYSIS_CONCURRENCY = int(os.getenv("BATCH_ANALYSIS_CONCURRENCY", "4"))
+
+# Sınır olay döngüsünde uygulanır: slot bekleyen dosyalar executor thread'i tutmaz.
+# Flask ve ASGI istekleri tek uzun ömürlü döngüde çalıştığı için semafor tüm istekler arasında ortaktır.
+_analysis_slots = asyncio.Semaphore(BATCH_ANALYSIS_CONCURRENCY)
+
+
+def merge_transactions(results):
+    """
+    Union of the files' transactions. Statements with overlapping periods (and
+    rows restored from the ingestion index) repeat the same transaction, so each
+    fingerprint is kept as many times as it occurs in any single file, not summed.
+    """
+    kept = Counter()
+    merged = []
+    for result in results:
+        seen = Counter()
+        for t in result.get("transactions") or []:
+            if not isinstance(t, dict):
+                continue
+            fingerprint = transaction_fingerprint(t)
+            if fingerprint is not None:
+                seen[fingerprint] += 1
+                if seen[fingerprint] <= kept[fingerprint]:
+                    continue
+                kept[fingerprint] += 1
+            merged.append(t)
+    return merged
+
+
+def merge_category_totals(transactions):
+    """Sums spending per category ("1.234,56 TL") over already de-duplicated transactions, in minor units."""
+    totals, skipped = totals_by(transactions, "spending_category", include=lambda t: t.get("flow") == "spending")
+    if skipped:
+        print(f"⚠️ {skipped} işlemin tutarı çözümlenemedi; birleşik toplama katılmadı.")
+    return {category: format_minor(total) for category, total in sorted(totals.items(), key=lambda kv: -abs(kv[1]))}
+
+
+def _sum_costs(costs):
+    total = {}
+    for cost in costs:
+        for key, value in (cost or {}).items():
+            total[key] = total.get(key, 0) + value
+    return {key: round(value, 6) if isinstance(value, float) else value for key, value in total.items()}
+
+
+async def stream_batch(uploaded_files, user=None, job_id=None):
+    """
+    Analyzes several statements concurrently and yields event dicts:
+      {"type": "job", "job_id": ..., "files": [...]}                           once, first
+      {"type": "file", "index": ..., "filename": ..., "job_id": ..., "success": ..., "response" | "error": ...}
+                                                                                 per file, in completion order
+      {"type": "final", "status": ..., "success": ..., "category_totals": ..., "cost": ...}   once, last
+    Each file gets its own job id ("<job_id>-<index>", or a fresh one if taken) for /job-status.
+    """
+    files = [f for f in uploaded_files if f is not None and getattr(f, "filename", None)]
+    filenames = [f.filename for f in files]
+    user_key = user_key_from_form(user)
+    # İş, yüklemeyi yapan kullanıcıya bağlanır; kullanıcı bilgisi iş kaydına yazılmaz (/job-status kimlik doğrulamasız okunur)
+    job_id = job_status.create(resolve_job_id(job_id), owner=user_key, status="processing",
+                               step=f"Analyzing {len(files)} statements...", files=filenames)
+    yield {"type": "job", "job_id": job_id, "files": filenames}
+
+    if not files:
+        job_status.finish(job_id, "failed")
+        yield {"type": "final", "status": 400, "success": False, "message": "At least one PDF file is required", "job_id": job_id}
+        return
+    if len(files) > BATCH_MAX_FILES:
+        job_status.finish(job_id, "failed")
+        yield {"type": "final", "status": 400, "success": False, "message": f"At most {BATCH_MAX_FILES} files per batch", "job_id": job_id}
+        return
+
+    analyze = agents["expenseanalyzeragent"].categorize_pdf
+
+    async def run(index, uploaded_file):
+        file_job_id = job_status.create(f"{job_id}-{index}", owner=user_key, status="queued",
+                                        step="Waiting for a free analysis slot...", filename=uploaded_file.filename)
+        async with _analysis_slots:
+            try:
+                if not uploaded_file.filename.lower().endswith(".pdf"):
+                    raise ValueError("Only PDF statements are supported")
+                job_status.update(file_job_id, status="processing", step="Analyzing statement...")
+                result = await asyncio.to_thread(analyze, uploaded_file, file_job_id, user_key)
+                job_status.finish(file_job_id, "done")
+                return index, file_job_id, result, None
+            except Exception as e:
+                print(f"🚫 {uploaded_file.filename}: {e}")
+                job_status.finish(file_job_id, "failed")
+                return index, file_job_id, None, e
+
+    tasks = [asyncio.create_task(run(i, f)) for i, f in enumerate(files)]
+    results = []
+    costs = []
+    try:
+        for completed in asyncio.as_completed(tasks):
+            index, file_job_id, result, error = await completed
+            filename = filenames[index]
+            file_job = job_status.get(file_job_id) or {}
+            costs.append(file_job.get("cost"))
+            job_status.add_step(job_id, f"{filename}: {'done' if error is None else 'failed'}")
+            if error is None:
+                results.append(result)
+                yield {"type": "file", "index": index, "filename": filename, "job_id": file_job_id, "success": True,
+                       "cache_hit": file_job.get("cache_hit"), "response": result}
+            else:
+                yield {"type": "file", "index": index, "filename": filename, "job_id": file_job_id, "success": False,
+                       "error": str(error)}
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        job_status.finish(job_id, "failed")
+        raise
+
+    failed = len(files) - len(results)
+    cost = _sum_costs(costs)
+    # Çakışan ekstrelerdeki aynı işlem birleşik toplamda bir kez sayılır
+    transactions = merge_transactions(results)
+    job_status.finish(job_id, "done" if results else "failed", cost=cost)
+    yield {
+        "type": "final",
+        "status": 200 if results else 500,
+        "success": bool(results),
+        "job_id": job_id,
+        "succeeded": len(results),
+        "failed": failed,
+        "category_totals": merge_category_totals(transactions),
+        "transaction_count": len(transactions),
+        "skipped_transactions": sum((r.get("ingestion") or {}).get("skipped", 0) for r in results),
+        "cost": cost,
+    }
+
+
+async def handle_batch(uploaded_files, user=None, job_id=None):
+    """Non-streaming variant: returns (body, status) with every per-file result."""
+    files = []
+    final = None
+    async for event in stream_batch(uploaded_files, user, job_id):
+        if event["type"] == "file":
+            files.append(event)
+        elif event["type"] == "final":
+            final = event
+    status = final.pop("status")
+    final.pop("type")
+    files.sort(key=lambda e: e["index"])
+    for event in files:
+        event.pop("type")
+    return {**final, "files": files}, status
@@ -1,19 +1,20 @@
 import os
 import requests
-import google.generativeai as genai
 from dotenv import load_dotenv
 import json
-from pymongo import MongoClient
-import re
-from bson import ObjectId
 
-from agents.baseAgent import Agent
+from agents.baseAgent import Agent, get_model
+from agents.money import parse_minor_many, minor_to_float
+from agents.embedding_cache import get_embedding_cache
+from agents.expenseAnalyzerAgent import spendingCategories
+from agents.vector_index import make_vector_backend, VECTOR_SEARCH_LIMIT, VECTOR_SEARCH_NUM_CANDIDATES
 
 # Load environment variables
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 BACKEND_URL = os.getenv("BACKEND_URL")
 MONGO_URL = os.getenv("MONGO_URL")
+# Odak anahtar kelimeleri sabit kategori listesinden gelir; vektörleri açılışta belleğe alınır
+PRELOAD_CATEGORY_EMBEDDINGS = os.getenv("PRELOAD_CATEGORY_EMBEDDINGS", "1") == "1"
 
 budgetPlannerAgentRole = """
     You are budgetPlannerAgent and your role is to analyze the user's financial data and provide insights on their spending habits.
@@ -111,30 +112,28 @@ budgetPlannerAgentRole = """
 class BudgetPlannerAgent(Agent):
     def __init__(self, name, role):
         super().__init__(name=name, role=role)
-
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
-            },
-            system_instruction=self.role,
-        )
-        self.helperModel = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
-            },
-        )
-        self.mongo_client = MongoClient(MONGO_URL)
-        self.transactions_collection = self.mongo_client["test"]["transactions" ]
+        self._mongo_client = None
+        self._vector_backend = None
+
+    # MongoClient ilk vektör aramasında açılır (import anında değil)
+    @property
+    def transactions_collection(self):
+        if self._mongo_client is None:
+            from pymongo import MongoClient
+            self._mongo_client = MongoClient(MONGO_URL)
+        return self._mongo_client["test"]["transactions"]
+
+    # VECTOR_BACKEND: "atlas" ($vectorSearch) ya da "local" (süreç içi NumPy indeksi)
+    @property
+    def vector_backend(self):
+        if self._vector_backend is None:
+            self._vector_backend = make_vector_backend(lambda: self.transactions_collection)
+        return self._vector_backend
+
+    # Rol metni olmadan aynı ayarlarla çalışan yardımcı model (odak kategorilerini seçer)
+    @property
+    def helperModel(self):
+        return get_model(self.model_name, self.generation_config)
 
     def get_user_data(self, user_id):
         try:
@@ -165,21 +164,13 @@ class BudgetPlannerAgent(Agent):
         from collections import defaultdict
         from datetime import datetime
 
-        def parse_amount(amt_str):
-            try:
-                amt_str = re.sub(r"[^\d,.-]", "", amt_str)
-                if ',' in amt_str and '.' in amt_str:
-                    amt_str = amt_str.replace('.', '')
-                amt_str = amt_str.replace(',', '.')
-                return float(amt_str)
-            except Exception as e:
-                print(f"parse_amount error for '{amt_str}': {e}")
-                return 0.0
-
-        monthly_data = defaultdict(lambda: {"income": 0.0, "spending": 0.0})
+        # Tutarlar kuruş cinsinden tamsayı olarak toplanır, çıktıda TL'ye (float) çevrilir
+        monthly_data = defaultdict(lambda: {"income": 0, "spending": 0})
 
-        for txn in transactions:
-            amt = parse_amount(txn.get("amount", "0"))
+        for txn, amt in zip(transactions, parse_minor_many(txn.get("amount", "0") for txn in transactions)):
+            if amt is None:
+                print(f"parse_amount error for '{txn.get('amount')}'")
+                amt = 0
             flow = txn.get("flow", "").lower()
             date_str = txn.get("date", "")
             try:
@@ -197,24 +188,20 @@ class BudgetPlannerAgent(Agent):
             elif flow == "spending":
                 monthly_data[month_key]["spending"] += amt
 
-        # Round results
         for key in monthly_data:
-            monthly_data[key]["income"] = round(monthly_data[key]["income"], 2)
-            monthly_data[key]["spending"] = round(monthly_data[key]["spending"], 2)
+            monthly_data[key]["income"] = minor_to_float(monthly_data[key]["income"])
+            monthly_data[key]["spending"] = minor_to_float(monthly_data[key]["spending"])
 
         return dict(monthly_data)
 
     def get_precomputed_embedding(self, text):
-        try:
-            response = genai.embed_content(
-                model="models/embedding-001",
-                content=text,
-                task_type="retrieval_document",
-            )
-            return response["embedding"]
-        except Exception as e:
-            print(f"Embedding error: {e}")
-            return []
+        # Kategoriler bellekte sabit; diğer metinler kalıcı embedding önbelleğinden gelir
+        return get_embedding_cache().embed(text)
+
+    def preload_category_embeddings(self):
+        count = get_embedding_cache().preload(spendingCategories)
+        print(f"🧭 {count}/{len(spendingCategories)} kategori embedding'i belleğe alındı.")
+        return count
 
     def initial_llm_analysis(self, user_info, financial_summary):
         prompt = f"""
@@ -224,19 +211,23 @@ class BudgetPlannerAgent(Agent):
       == Financial Summary ==
       {json.dumps(financial_summary, indent=2)}
 
-      Based on this data, what are the top 3 financial improvement areas to focus on? You can only return this keywords [
-    "food_drinks", "clothing_cosmetics", "subscription", "groceries",
-    "transportation", "entertainment", "stationery_books", "technology",
-    "bill_payment", "education", "health", "cash_withdrawal", "other"
-]
+      Based on this data, what are the top 3 financial improvement areas to focus on? You can only return this keywords {json.dumps(spendingCategories)}
 .
       """
-        response = self.helperModel.generate_content(prompt)
+        response = self.call_model(prompt, model=self.helperModel)
         keywords = json.loads(response.text.strip())
         return keywords
 
-    def retrieve_contextual_transactions(self, focus_keywords, top_k=80):
-        
+    def retrieve_contextual_transactions(self, focus_keywords, user_id=None, top_k=VECTOR_SEARCH_LIMIT,
+                                         num_candidates=VECTOR_SEARCH_NUM_CANDIDATES):
+        """
+        Vector search over the user's own transactions for every focus keyword
+        through the configured backend (Atlas or the local index). Results are
+        merged by _id (best score kept, matching keywords listed) and returned
+        best first, without the embeddings field.
+        """
+        from bson import ObjectId
+
         def convert_objectid(obj):
             if isinstance(obj, list):
                 return [convert_objectid(i) for i in obj]
@@ -247,53 +238,39 @@ class BudgetPlannerAgent(Agent):
             else:
                 return obj
 
-        all_results = []
-
-        for keyword in focus_keywords:
-            query_embedding = self.get_precomputed_embedding(keyword)
-            print(f"🔍 Searching for keyword: {keyword}")
-            
-            results = self.transactions_collection.aggregate(
-                [
-                    {
-                        "$vectorSearch": {
-                            "index": "vector_index",
-                            "path": "embeddings",
-                            "queryVector": query_embedding,
-                            "numDimensions": 768,
-                            "numCandidates": 100,
-                            "limit": top_k,
-                        }
-                    }
-                ]
-            )
-            convertedResult=convert_objectid(list(results))  # Convert ObjectId to string
-            # embeddings alanını çıkar ve tüm ObjectId, date gibi alanları stringe çevir
-            cleaned_results = [
-            {k: v for k, v in doc.items() if k != "embeddings"}
-            for doc in convertedResult
-        ]
-
-            print(f"{cleaned_results} for keyword '{keyword}' retrieved.")
-            all_results.extend(cleaned_results)
-
-            return all_results
-
-    
-    
+        keywords = [k for k in dict.fromkeys(focus_keywords or []) if isinstance(k, str) and k]
+        if not keywords:
+            return []
+        # Kategori vektörleri bellekte hazır; tek çağrıda alınır
+        query_embeddings = get_embedding_cache().embed_many(keywords)
+        for keyword in keywords:
+            if not query_embeddings.get(keyword):
+                print(f"⚠️ No embedding for keyword '{keyword}', skipped.")
+        query_vectors = {k: query_embeddings[k] for k in keywords if query_embeddings.get(k)}
+
+        print(f"🔍 Searching for keywords {list(query_vectors)} ({self.vector_backend.name} backend)")
+        searches = self.vector_backend.search(user_id, query_vectors, top_k, num_candidates).items()
+
+        merged = {}
+        for keyword, docs in searches:
+            print(f"{len(docs)} transactions for keyword '{keyword}' retrieved.")
+            for doc in docs:
+                key = str(doc.get("_id"))
+                best = merged.get(key)
+                if best is None:
+                    merged[key] = {**doc, "matched_keywords": [keyword]}
+                else:
+                    best["matched_keywords"].append(keyword)
+                    if doc.get("score", 0) > best.get("score", 0):
+                        best["score"] = doc["score"]
+
+        ranked = sorted(merged.values(), key=lambda d: d.get("score", 0), reverse=True)
+        return convert_objectid(ranked)
 
-    
     def filter_transactions(self, transactions, min_amount=0.0, max_per_category=5):
-        def parse_amount(amt_str):
-            a = re.sub(r"[^\d,.-]", "", amt_str).replace(",", ".")
-            try:
-                return float(amt_str)
-            except:
-                return 0.0
-
         filtered = {}
-        for txn in transactions:
-            amt = parse_amount(txn.get("amount", "0"))
+        for txn, minor in zip(transactions, parse_minor_many(txn.get("amount", "0") for txn in transactions)):
+            amt = minor_to_float(minor) if minor is not None else 0.0
             if amt < min_amount:
                 continue
             cat = txn.get("spendingCategory", "unknown")
@@ -359,7 +336,7 @@ class BudgetPlannerAgent(Agent):
 
         # Vektör araması ile ilgili işlemler
         relevant_txns = self.retrieve_contextual_transactions(
-            focus_keywords
+            focus_keywords, user_id
         )
   
         print(f"📥Before filtering retrieved {len(relevant_txns)} relevant transactions from vector DB")
@@ -389,9 +366,30 @@ class BudgetPlannerAgent(Agent):
         print("📝 Final Prompt Sent to LLM:\n", prompt[:1500], "...\n")
        
         try:
-            response = self.model.generate_content(prompt)
+            response = self.call_model(prompt)
             
             return json.loads(response.text.strip())
         except Exception as e:
             print("❌ LLM error:", e)
             return {"error": "LLM failed to return valid JSON."}
+
+
+_budget_planner = None
+
+
+def get_budget_planner():
+    global _budget_planner
+    if _budget_planner is None:
+        _budget_planner = BudgetPlannerAgent("BudgetPlannerAgent", budgetPlannerAgentRole)
+    return _budget_planner
+
+
+def preload_category_embeddings():
+    """Startup hook: loads (or computes once) the category embeddings; failures only log."""
+    if not PRELOAD_CATEGORY_EMBEDDINGS:
+        return 0
+    try:
+        return get_budget_planner().preload_category_embeddings()
+    except Exception as e:
+        print(f"⚠️ Kategori embedding'leri yüklenemedi: {e}")
+        return 0
@@ -0,0 +1,237 @@
+import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.orcestratorAgent import Orcestrator, orcestratorAgentRole, agents
+from agents.job_tracking import job_status, resolve_job_id
+from agents.conversation_memory import user_key_from_form
+from agents.json_stream import IncrementalJSONParser
+
+# Bloklayan SDK / HTTP çağrıları için sınırlı thread havuzu (ASGI döngüsü ve Flask arka plan döngüsü)
+AGENT_EXECUTOR_WORKERS = int(os.getenv("AGENT_EXECUTOR_WORKERS", "16"))
+
+orchestrator = Orcestrator("Orchestrator", orcestratorAgentRole)
+
+
+def is_truthy(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+# /chat akışının tek kopyası: Flask bunu run_sync ile arka plan döngüsünde, ASGI ise kendi döngüsünde await eder.
+# Bloklayan SDK çağrıları asyncio.to_thread ile döngünün varsayılan executor'ına gider.
+async def handle_chat(user_text, uploaded_file, user, job_id=None, on_chunk=None):
+    if not user_text and not uploaded_file:
+        return {"success": False, "message": "Message or file is required"}, 400
+    job_id = _create_job(job_id, user, user_text)
+    return await _handle_job(job_id, user_text, uploaded_file, user, on_chunk)
+
+
+def _create_job(job_id, user, user_text):
+    # İş, isteği gönderen kullanıcıya bağlanır; /job-status yalnızca ona gösterir.
+    # Id tek yerde çözülüp iş aynı anda oluşturulur; istemciye bildirilen id sonradan değişmez
+    return job_status.create(resolve_job_id(job_id), owner=user_key_from_form(user),
+                             status="processing", step="routing to agent", user_input=user_text)
+
+
+async def _handle_job(job_id, user_text, uploaded_file, user, on_chunk=None):
+    try:
+        body, status = await _run_chat(user_text, uploaded_file, user, job_id, on_chunk)
+    except Exception:
+        job_status.finish(job_id, "failed")
+        raise
+
+    job_status.finish(job_id, "done" if status < 400 else "failed")
+    body["job_id"] = job_id
+    return body, status
+
+
+async def _run_chat(user_text, uploaded_file, user, job_id, on_chunk=None):
+    # Step 1: Get orchestrator job decision (local fast path first, LLM only if ambiguous)
+    user_key = user_key_from_form(user)
+    decision_json = await orchestrator.decide_job(
+        user_text, has_file=bool(uploaded_file and uploaded_file.filename), user_key=user_key
+    )
+
+    # Handle Job 1: Routing
+    if decision_json["job"] == "routing":
+        selected_agent_key = decision_json["selected_agent"]
+
+        if selected_agent_key not in agents:
+            return {"success": False, "message": f"Unknown agent: {selected_agent_key}"}, 400
+
+        print(f"📬 Routing to: {selected_agent_key}")
+        agent = agents[selected_agent_key]
+
+        # Handle file input (only valid for expenseAnalyzerAgent)
+        if selected_agent_key == "expenseanalyzeragent":
+            if uploaded_file and uploaded_file.filename:
+                result = await asyncio.to_thread(agent.categorize_pdf, uploaded_file, job_id, user_key)
+            else:
+                return {"success": False, "message": "Please upload a PDF file for analysis"}, 400
+
+        # Handle async agents
+        elif selected_agent_key == "lifeplanneragent":
+            result = await agent.get_life_plan(user_text, user, job_id, on_chunk=on_chunk)
+
+        elif selected_agent_key == "investmentadvisoragent":
+            result = await agent.get_financal_advise(user_text, user, job_id, on_chunk=on_chunk)
+
+        # Handle synchronous agents
+        else:
+            result = await asyncio.to_thread(agent.generate_response, user_text, on_chunk)
+
+        # Save history (per user, token-bounded, large responses summarized; anonymous requests keep none)
+        if user_key:
+            await asyncio.to_thread(orchestrator.memory.append, user_key, user_text, selected_agent_key, result)
+
+        # Step 2: Transport the agent output (LLM rewrite only if it doesn't match the expected envelope)
+        final_response = await asyncio.to_thread(orchestrator.generate_final_response, user_text, result, selected_agent_key)
+        print(f"📦 Raw orchestrator response: {final_response}")
+
+        if not final_response:
+            return {"success": False, "message": "Orchestrator failed to generate final response"}, 500
+
+        try:
+            if isinstance(final_response, str):
+                parsed_response = json.loads(final_response)
+            else:
+                parsed_response = final_response
+
+            agent_resp = parsed_response.get("agent_response")
+            if isinstance(agent_resp, str):
+                extra_parsed = json.loads(agent_resp)
+            else:
+                extra_parsed = agent_resp
+        except Exception as parse_err:
+            print(f"🧨 JSON parse error: {parse_err}")
+            print(f"📝 Raw final_response: {final_response}")
+            return {
+                "success": False,
+                "message": "Final response could not be parsed",
+                "error": str(parse_err),
+            }, 500
+
+        return {"success": True, "response": extra_parsed}, 200
+
+    # Handle Job 2: Already in natural language
+    elif decision_json["job"] == "transporting":
+        return {"success": True, "response": decision_json["transporting"]}, 200
+
+    else:
+        return {"success": False, "message": "Invalid job type from orchestrator"}, 400
+
+
+async def stream_chat(user_text, uploaded_file, user, job_id=None):
+    """
+    Streaming variant of handle_chat. Yields event dicts:
+      {"type": "job", "job_id": ...}                      once, first (not sent for a rejected request)
+      {"type": "partial", "path": [...], "value": ...}    each completed field / array item of the agent's JSON
+      {"type": "final", "status": ..., "success": ..., "response": ...}   once, last
+    """
+    if not user_text and not uploaded_file:
+        body, status = await handle_chat(user_text, uploaded_file, user)
+        yield {"type": "final", "status": status, **body}
+        return
+
+    job_id = _create_job(job_id, user, user_text)
+    yield {"type": "job", "job_id": job_id}
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    parser = IncrementalJSONParser()
+
+    def feed(text):
+        for path, value in parser.feed(text):
+            queue.put_nowait({"type": "partial", "path": list(path), "value": value})
+
+    # Senkron ajanlar parçaları worker thread'den gönderir; ayrıştırma her zaman döngüde yapılır
+    def on_chunk(text):
+        loop.call_soon_threadsafe(feed, text)
+
+    task = asyncio.create_task(_handle_job(job_id, user_text, uploaded_file, user, on_chunk=on_chunk))
+    try:
+        while not task.done() or not queue.empty():
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+
+        body, status = task.result()
+        yield {"type": "final", "status": status, **body}
+    except Exception as e:
+        print(f"Error in stream_chat: {e}")
+        yield {
+            "type": "final",
+            "status": 500,
+            "success": False,
+            "message": "An error occurred while processing your request",
+            "error": str(e),
+            "job_id": job_id,
+        }
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def ndjson_line(event):
+    return json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+
+def iter_chat_stream(user_text, uploaded_file, user, job_id=None):
+    """Synchronous NDJSON iterator over stream_chat for the Flask app."""
+    return iter_ndjson(stream_chat(user_text, uploaded_file, user, job_id))
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """
+    One long-lived event loop on a daemon thread for the Flask app. The async
+    Gemini client binds to the first loop that uses it, so every Flask request
+    and stream must run on the same loop instead of a fresh asyncio.run().
+    """
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(max_workers=AGENT_EXECUTOR_WORKERS, thread_name_prefix="agent-io"))
+                threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+def run_sync(coro):
+    """Runs a coroutine on the background loop and blocks the calling (Flask) thread for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
+
+
+_END_OF_STREAM = object()
+
+
+async def _next_event(events):
+    try:
+        return await events.__anext__()
+    except StopAsyncIteration:
+        return _END_OF_STREAM
+
+
+def iter_ndjson(events):
+    """
+    Drives an async event generator on the background loop for the lifetime
+    of a Flask response and yields its events as NDJSON lines.
+    """
+    try:
+        while True:
+            event = run_sync(_next_event(events))
+            if event is _END_OF_STREAM:
+                break
+            yield ndjson_line(event)
+    finally:
+        run_sync(events.aclose())
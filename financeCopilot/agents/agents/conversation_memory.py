@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+from agents.baseAgent import cache_path
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH") or cache_path("conversation_memory.sqlite3")
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "20"))
+CONVERSATION_MAX_USERS_IN_MEMORY = int(os.getenv("CONVERSATION_MAX_USERS_IN_MEMORY", "500"))
+MAX_USER_INPUT_CHARS = 500
+MAX_SUMMARY_CHARS = 600
+
+# Kullanıcı kimliği olmayan isteklerin geçmişi eskiden bu ortak anahtarla saklanıyordu
+_LEGACY_ANONYMOUS_KEY = "anonymous"
+
+
+def estimate_tokens(text):
+    # Kaba tahmin: ~4 karakter / token
+    return len(text) // 4 + 1
+
+
+def user_key_from_form(user):
+    """
+    /chat'e gelen `user` alanından (oturum kullanıcısının JSON'u ya da ham id) kararlı bir anahtar üretir.
+    Kimlik yoksa None döner; bu istekler kalıcı hafızaya ve kullanıcı indekslerine yazılmaz.
+    """
+    if not user:
+        return None
+    try:
+        parsed = json.loads(user)
+    except (TypeError, ValueError):
+        parsed = None
+    if isinstance(parsed, dict):
+        return str(parsed["id"]) if parsed.get("id") else None
+    return str(user)[:128]
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def summarize_agent_response(agent_response):
+    """
+    Büyük ajan yanıtlarını (ör. tüm işlem dökümü) yönlendirme bağlamı için kısa bir özete indirger.
+    Soru soran yanıtlar soru metniyle saklanır ki takip mesajı aynı ajana dönebilsin.
+    """
+    if isinstance(agent_response, str):
+        try:
+            agent_response = json.loads(agent_response)
+        except (TypeError, ValueError):
+            return _truncate(agent_response.strip(), MAX_SUMMARY_CHARS)
+
+    if not isinstance(agent_response, dict):
+        return _truncate(json.dumps(agent_response, ensure_ascii=False, default=str), MAX_SUMMARY_CHARS)
+
+    if agent_response.get("askingQuestion") and agent_response.get("question"):
+        return _truncate(str(agent_response["question"]).strip(), MAX_SUMMARY_CHARS)
+
+    if isinstance(agent_response.get("transactions"), list):
+        totals = json.dumps(agent_response.get("category_totals", {}), ensure_ascii=False)
+        summary = f"Analyzed statement with {len(agent_response['transactions'])} transactions. Category totals: {totals}"
+    elif isinstance(agent_response.get("lifePlan"), dict):
+        plan = agent_response["lifePlan"]
+        summary = f"Life plan for goal: {plan.get('goal')}. Timeline: {plan.get('timeline')}. Estimated cost: {plan.get('estimatedCost')}"
+    elif isinstance(agent_response.get("recommendations"), list):
+        tickers = [r.get("ticker") for r in agent_response["recommendations"] if isinstance(r, dict)]
+        summary = f"Investment advice recommending: {', '.join(t for t in tickers if t)}"
+    elif isinstance(agent_response.get("response"), str):
+        summary = agent_response["response"].strip()
+    else:
+        summary = json.dumps(agent_response, ensure_ascii=False, default=str)
+
+    return _truncate(summary, MAX_SUMMARY_CHARS)
+
+
+class ConversationStore:
+    """
+    Per-user conversation memory backed by SQLite.
+
+    Each user's turns live in a ring buffer capped by an estimated token
+    budget (and a hard turn limit); older turns are dropped from memory and
+    from disk. Only a bounded number of users are kept loaded at once.
+    """
+
+    def __init__(self, db_path=CONVERSATION_DB_PATH, token_budget=CONVERSATION_TOKEN_BUDGET,
+                 max_turns=CONVERSATION_MAX_TURNS, max_users=CONVERSATION_MAX_USERS_IN_MEMORY):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_key TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                user_input TEXT,
+                agent_key TEXT,
+                agent_response TEXT,
+                tokens INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_turns_user ON turns (user_key, id)")
+        # Farklı anonim istemcilerin karışmış ortak geçmişi okunmaz, silinir
+        self._conn.execute("DELETE FROM turns WHERE user_key = ?", (_LEGACY_ANONYMOUS_KEY,))
+        self._conn.commit()
+
+    def _load(self, user_key):
+        turns = self._users.get(user_key)
+        if turns is not None:
+            self._users.move_to_end(user_key)
+            return turns
+
+        rows = self._conn.execute(
+            "SELECT id, user_input, agent_key, agent_response, tokens FROM turns "
+            "WHERE user_key = ? ORDER BY id DESC LIMIT ?",
+            (user_key, self.max_turns),
+        ).fetchall()
+        turns = deque(
+            {"id": row[0], "user_input": row[1], "agent_key": row[2], "agent_response": row[3], "tokens": row[4]}
+            for row in reversed(rows)
+        )
+        self._trim(turns)
+        self._users[user_key] = turns
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return turns
+
+    def _trim(self, turns):
+        total = sum(t["tokens"] for t in turns)
+        while turns and (len(turns) > self.max_turns or total > self.token_budget):
+            total -= turns.popleft()["tokens"]
+
+    def append(self, user_key, user_input, agent_key, agent_response):
+        user_input = _truncate((user_input or "").strip(), MAX_USER_INPUT_CHARS)
+        summary = summarize_agent_response(agent_response)
+        tokens = estimate_tokens(user_input) + estimate_tokens(summary)
+
+        with self._lock:
+            turns = self._load(user_key)
+            cursor = self._conn.execute(
+                "INSERT INTO turns (user_key, created_at, user_input, agent_key, agent_response, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_key, time.time(), user_input, agent_key, summary, tokens),
+            )
+            turns.append({
+                "id": cursor.lastrowid,
+                "user_input": user_input,
+                "agent_key": agent_key,
+                "agent_response": summary,
+                "tokens": tokens,
+            })
+            self._trim(turns)
+            oldest_kept = turns[0]["id"] if turns else cursor.lastrowid + 1
+            self._conn.execute("DELETE FROM turns WHERE user_key = ? AND id < ?", (user_key, oldest_kept))
+            self._conn.commit()
+
+    def recent(self, user_key, limit=None):
+        with self._lock:
+            turns = list(self._load(user_key))
+        return turns[-limit:] if limit else turns
+
+    def last_turn(self, user_key):
+        turns = self.recent(user_key, limit=1)
+        return turns[0] if turns else None
+
+    def clear(self, user_key):
+        with self._lock:
+            self._users.pop(user_key, None)
+            self._conn.execute("DELETE FROM turns WHERE user_key = ?", (user_key,))
+            self._conn.commit()
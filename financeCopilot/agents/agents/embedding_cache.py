@@ -0,0 +1,176 @@
+import os
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from agents.baseAgent import cache_path, configure_genai
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+# Model aynı adla güncellenirse bu değer artırılarak eski vektörler devre dışı bırakılır
+EMBEDDING_MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+EMBEDDING_TASK_TYPE = "retrieval_document"
+EMBEDDING_CACHE_DB_PATH = os.getenv("EMBEDDING_CACHE_DB_PATH") or cache_path("embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_IN_MEMORY = int(os.getenv("EMBEDDING_CACHE_MAX_IN_MEMORY", "2048"))
+
+
+def compute_embedding(text, model=EMBEDDING_MODEL, task_type=EMBEDDING_TASK_TYPE):
+    import google.generativeai as genai
+
+    configure_genai()
+    return genai.embed_content(model=model, content=text, task_type=task_type)["embedding"]
+
+
+class EmbeddingCache:
+    """
+    Text -> embedding cache: an in-memory LRU in front of a SQLite table keyed
+    by (model@version, task type, text hash). Vectors are stored as float32.
+    Pinned texts (e.g. the spending categories) never leave memory.
+    """
+
+    def __init__(self, db_path=EMBEDDING_CACHE_DB_PATH, model=EMBEDDING_MODEL, version=EMBEDDING_MODEL_VERSION,
+                 max_in_memory=EMBEDDING_CACHE_MAX_IN_MEMORY):
+        self.model = model
+        self.model_key = f"{model}@{version}"
+        self.max_in_memory = max_in_memory
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._pinned = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_key TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (model_key, task_type, text_hash)
+            )
+            """
+        )
+        self._conn.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector, pin=False):
+        if pin:
+            self._pinned[key] = vector
+            self._memory.pop(key, None)
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_in_memory:
+            self._memory.popitem(last=False)
+
+    def _load(self, task_type, hashes):
+        found = {}
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model_key = ? AND task_type = ? "
+                f"AND text_hash IN ({','.join('?' * len(batch))})",
+                [self.model_key, task_type, *batch],
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = array.array("f", blob).tolist()
+        return found
+
+    def _store(self, task_type, items):
+        now = time.time()
+        rows = [(self.model_key, task_type, self._hash(t), t, array.array("f", v).tobytes(), now) for t, v in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def embed_many(self, texts, task_type=EMBEDDING_TASK_TYPE, pin=False):
+        """
+        Returns {text: vector}. Memory first, then SQLite, then the embedding API
+        for what is left; new vectors are persisted. Texts that fail to embed
+        are missing from the result.
+        """
+        texts = list(dict.fromkeys(t for t in texts if t))
+        result = {}
+        missing = []
+        with self._lock:
+            for text in texts:
+                key = (task_type, text)
+                vector = self._pinned.get(key) or self._memory.get(key)
+                if vector is not None:
+                    self.memory_hits += 1
+                    result[text] = vector
+                    if pin:
+                        self._remember(key, vector, pin=True)
+                    elif key in self._memory:
+                        self._memory.move_to_end(key)
+                else:
+                    missing.append(text)
+            if missing:
+                hashes = {self._hash(t): t for t in missing}
+                loaded = self._load(task_type, list(hashes))
+                for text_hash, vector in loaded.items():
+                    text = hashes[text_hash]
+                    self.disk_hits += 1
+                    result[text] = vector
+                    self._remember((task_type, text), vector, pin)
+                missing = [t for t in missing if t not in result]
+                self.misses += len(missing)
+
+        computed = []
+        for text in missing:
+            try:
+                vector = compute_embedding(text, self.model, task_type)
+            except Exception as e:
+                print(f"Embedding error: {e}")
+                continue
+            computed.append((text, vector))
+            result[text] = vector
+        if computed:
+            self._store(task_type, computed)
+            with self._lock:
+                for text, vector in computed:
+                    self._remember((task_type, text), vector, pin)
+        return result
+
+    def embed(self, text, task_type=EMBEDDING_TASK_TYPE):
+        return self.embed_many([text], task_type).get(text, [])
+
+    def preload(self, texts, task_type=EMBEDDING_TASK_TYPE):
+        """Pins texts in memory, computing and persisting any that were never embedded."""
+        vectors = self.embed_many(texts, task_type, pin=True)
+        return len(vectors)
+
+    def stats(self):
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model_key = ?", (self.model_key,)).fetchone()[0]
+            return {
+                "model": self.model_key,
+                "stored": stored,
+                "in_memory": len(self._memory),
+                "pinned": len(self._pinned),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    # SQLite dosyası ilk kullanımda açılır
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
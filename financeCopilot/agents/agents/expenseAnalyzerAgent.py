@@ -1,10 +1,18 @@
 import os
+import re
 import json
-import pdfplumber
-import tempfile
-from agents.baseAgent import Agent
-import google.generativeai as genai
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from agents.baseAgent import Agent, get_model, JSON_GENERATION_CONFIG
+from agents.llm_scheduler import PRIORITY_BATCH, estimate_prompt_tokens
 from agents.job_tracking import job_status
+from agents.statement_parsers import parse_known_statement
+from agents.merchant_cache import get_merchant_cache
+from agents.result_cache import get_result_cache
+from agents.uploads import BufferedUpload
+from agents.pdf_extract import iter_page_texts
+from agents.ingestion_index import get_transaction_index
+from agents.money import normalize_many, format_minor, parse_minor
 
 spendingCategories = [
     "food_drinks", "clothing_cosmetics", "subscription", "groceries",
@@ -124,179 +132,459 @@ Example Target JSON Structure:
 }}
 """
 
+# Bilinen ekstre düzenlerinde işlemler yerel olarak ayrıştırılır; model yalnızca kategori seçer
+transactionCategorizerRole = f"""
+You are a transaction categorization assistant.
+You will receive numbered bank transaction descriptions, one per line, optionally followed by the bank's label in brackets:
+1. SATIŞ-517040*7261-MIGROS [Alışveriş]
+2. MAAŞ ÖDEMESİ [Maaş]
+
+Assign each line exactly one spending category from this list: {spendingCategories}
+Return only a JSON object mapping each line number to its category, e.g. {{"1": "groceries", "2": "other"}}
+Use "other" when no category fits. Output must be valid JSON.
+"""
+
+# Tek bir kategori isteğinde gönderilen en fazla benzersiz açıklama sayısı
+CATEGORY_BATCH_SIZE = int(os.getenv("CATEGORY_BATCH_SIZE", "80"))
+
+# Aynı anda Gemini'ye gönderilen parça sayısı (süreç genelindeki sınır llm_scheduler'dadır)
+EXPENSE_CHUNK_CONCURRENCY = int(os.getenv("EXPENSE_CHUNK_CONCURRENCY", "4"))
+
+# Parçalar karakter yerine tahmini token bütçesiyle boyutlanır; başlık (müşteri / limit) ayrıca taşınır
+EXPENSE_CHUNK_TOKEN_BUDGET = int(os.getenv("EXPENSE_CHUNK_TOKEN_BUDGET", "2000"))
+HEADER_CONTEXT_MAX_TOKENS = int(os.getenv("HEADER_CONTEXT_MAX_TOKENS", "300"))
+# Tarihle başlayan satır yeni bir işlemin başlangıcıdır (07.05.2025, 07/05/25, 7-5-2025 ...);
+# ardından ikinci bir tarih gelen dönem satırları ("08/04/2025 - 09/05/2025 aralığında ...") başlıkta kalır
+TRANSACTION_LINE_RE = re.compile(r"^\s*\d{1,2}[./-]\d{1,2}[./-]\d{2,4}\b(?!\s*-\s*\d{1,2}[./-]\d{1,2}[./-]\d{2,4})")
+
+TEXT_GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 2048,
+}
+
 class ExpenseAnalyzerAgent(Agent):
     def __init__(self, name, role):
         super().__init__(name=name, role=role)
 
-        self.json_model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json"
-            },
-            system_instruction=self.role,
-        )
-
-        self.text_model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 2048
-            },
-            system_instruction=self.role,
-        )
-
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
+    @property
+    def json_model(self):
+        return self.model
+
+    @property
+    def text_model(self):
+        return get_model(self.model_name, TEXT_GENERATION_CONFIG, self.role)
+
+    @property
+    def category_model(self):
+        return get_model(self.model_name, JSON_GENERATION_CONFIG, transactionCategorizerRole)
+
+    def categorize_batch(self, items):
+        """
+        items: [(description, label)]. Sends them as numbered lines and reads back
+        index -> category. Returns ({description: category}, input_tokens, output_tokens).
+        """
+        lines = []
+        for i, (description, label) in enumerate(items, start=1):
+            line = f"{i}. {' '.join(description.split())}"
+            lines.append(f"{line} [{label}]" if label else line)
+
+        response = self.call_model("\n".join(lines), model=self.category_model, priority=PRIORITY_BATCH)
+        input_tokens = output_tokens = 0
+        if hasattr(response, "usage_metadata"):
+            input_tokens = response.usage_metadata.prompt_token_count
+            output_tokens = response.usage_metadata.candidates_token_count
+
+        try:
+            predicted = json.loads(response.text)
+        except (ValueError, AttributeError) as e:
+            print(f"❌ Kategori yanıtı çözümlenemedi: {str(e)}")
+            return {}, input_tokens, output_tokens
+        if isinstance(predicted, dict) and isinstance(predicted.get("categories"), dict):
+            predicted = predicted["categories"]
+        if not isinstance(predicted, dict):
+            return {}, input_tokens, output_tokens
+
+        categories = {}
+        for index, category in predicted.items():
+            try:
+                position = int(index) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= position < len(items) and category in spendingCategories:
+                categories[items[position][0]] = category
+        return categories, input_tokens, output_tokens
+
+    def categorize_descriptions(self, transactions, job_id=None):
+        """
+        Fills spending_category in place. Merchants already in the persistent
+        cache are answered locally; only the remaining unique descriptions go
+        to the model, in numbered batches of CATEGORY_BATCH_SIZE.
+        Returns (input_tokens, output_tokens).
+        """
+        unique = {}
+        for t in transactions:
+            unique.setdefault(t["description"], t.get("label"))
+
+        merchant_cache = get_merchant_cache()
+        categories = merchant_cache.lookup(unique)
+        job_status.update(job_id, merchant_cache={"hits": len(categories), "misses": len(unique) - len(categories)})
+
+        items = [(d, label) for d, label in unique.items() if d not in categories]
+        batches = [items[i:i + CATEGORY_BATCH_SIZE] for i in range(0, len(items), CATEGORY_BATCH_SIZE)]
+        print(f"🏷️ {len(unique)} benzersiz açıklama: {len(categories)} önbellekten, {len(items)} Gemini'ye {len(batches)} istekte gönderiliyor...")
+
+        input_tokens = output_tokens = 0
+        if batches:
+            workers = max(1, min(EXPENSE_CHUNK_CONCURRENCY, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="expense-category") as pool:
+                for confirmed, batch_input, batch_output in pool.map(self.categorize_batch, batches):
+                    input_tokens += batch_input
+                    output_tokens += batch_output
+                    merchant_cache.store(confirmed)
+                    categories.update(confirmed)
+
+        for t in transactions:
+            category = categories.get(t["description"])
+            t["spending_category"] = category if category in spendingCategories else "other"
+        return input_tokens, output_tokens
+
+    def apply_merchant_cache(self, transactions, job_id=None):
+        """
+        For model-transformed transactions: replaces spending_category with the
+        cached one where the merchant is known and stores the model's valid
+        categories for the rest.
+        """
+        described = [t for t in transactions if isinstance(t.get("description"), str)]
+        unique = {t["description"] for t in described}
+
+        merchant_cache = get_merchant_cache()
+        categories = merchant_cache.lookup(unique)
+        job_status.update(job_id, merchant_cache={"hits": len(categories), "misses": len(unique) - len(categories)})
+        print(f"🏷️ {len(unique)} benzersiz açıklama: {len(categories)} kategori önbellekten alındı.")
+
+        learned = {}
+        for t in described:
+            category = categories.get(t["description"])
+            if category in spendingCategories:
+                t["spending_category"] = category
+            elif t.get("spending_category") in spendingCategories:
+                learned[t["description"]] = t["spending_category"]
+        merchant_cache.store(learned)
+
+    def parse_statement_locally(self, pdf_source, job_id=None, ingestion=None):
+        """
+        Returns chunk-style results [(parsed, input_tokens, output_tokens)] for a
+        recognized statement layout, or None so the caller falls back to the LLM pipeline.
+        With an ingestion session, transactions the user already ingested keep
+        their stored category and only the new ones are categorized.
+        """
+        try:
+            statement = parse_known_statement(pdf_source)
+        except Exception as e:
+            print(f"⚠️ Yerel ayrıştırma başarısız, LLM'e dönülüyor: {str(e)}")
+            return None
+        if statement is None:
+            return None
+
+        transactions = statement["transactions"]
+        job_status.add_step(job_id, f"Recognized {statement['layout']} layout; parsed {len(transactions)} transactions locally.")
+        to_categorize = transactions
+        if ingestion is not None:
+            to_categorize, known = ingestion.partition(transactions)
+            if known:
+                job_status.add_step(job_id, f"{len(known)} transactions were already ingested; categorizing only {len(to_categorize)} new ones.")
+        job_status.add_step(job_id, "Sending unique descriptions to Gemini for categorization...")
+        input_tokens, output_tokens = self.categorize_descriptions(to_categorize, job_id)
+
+        parsed = {
+            "type": "account statement",
+            "customer_info": statement["customer_info"],
+            "card_limit": statement["card_limit"],
+            "transactions": [
+                {
+                    "date": t["date"],
+                    "spending_category": t["spending_category"],
+                    "description": t["description"],
+                    "amount": t["amount"],
+                    "flow": t["flow"],
+                }
+                for t in transactions
+            ],
+        }
+        return [(parsed, input_tokens, output_tokens)]
+
+    def iter_pdf_pages(self, pdf_source):
+        """
+        Yields the text of each page in order. Pages are extracted across a process
+        pool, and pages without a text layer are OCR'd (see agents/pdf_extract.py).
+        """
         print("📄 PDF'den metin çıkarılıyor...")
-        all_text = ""
+        for i, text, used_ocr in iter_page_texts(pdf_source):
+            print(f"📃 Sayfa {i}: {len(text)} karakter" + (" (OCR)" if used_ocr else ""))
+            if text.strip():
+                yield text
+        print("✅ Metin çıkarma tamamlandı.")
+
+    def extract_text_from_pdf(self, pdf_source) -> str:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages, start=1):
-                    text = page.extract_text()
-                    print(f"📃 Sayfa {i}: {len(text) if text else 0} karakter")
-                    if text:
-                        all_text += text + "\n"
-            print("✅ Metin çıkarma tamamlandı.")
-            return all_text
+            return "".join(text + "\n" for text in self.iter_pdf_pages(pdf_source))
         except Exception as e:
             print(f"❌ Metin çıkarma hatası: {str(e)}")
             raise
 
-    def split_text_into_chunks(self, text, max_chars=5000):
+    def iter_statement_records(self, texts):
+        """
+        Splits statement text into (kind, text) records: "header" once, holding the
+        lines before the first transaction (capped at HEADER_CONTEXT_MAX_TOKENS),
+        then one "transaction" per dated line plus its continuation lines. Lines
+        that do not fit in the header cap are passed on as "other".
+        """
+        header, header_tokens, header_sent = [], 0, False
+        record = []
+        for text in texts:
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                if TRANSACTION_LINE_RE.match(line):
+                    if not header_sent:
+                        header_sent = True
+                        yield "header", "\n".join(header)
+                    if record:
+                        yield "transaction", "\n".join(record)
+                    record = [line]
+                elif record:
+                    record.append(line)
+                elif not header_sent and header_tokens + estimate_prompt_tokens(line) <= HEADER_CONTEXT_MAX_TOKENS:
+                    header.append(line)
+                    header_tokens += estimate_prompt_tokens(line)
+                else:
+                    yield "other", line
+        if not header_sent:
+            yield "header", "\n".join(header)
+        if record:
+            yield "transaction", "\n".join(record)
+
+    def iter_chunks(self, texts, token_budget=EXPENSE_CHUNK_TOKEN_BUDGET, skip_record=None):
+        """
+        Packs whole records into chunks of about token_budget estimated tokens and
+        emits each chunk as soon as it fills, so chunking runs while later pages are
+        still being read. A transaction is never split across chunks. The header is
+        sent as content in the first chunk and as labelled context in the others.
+        Transaction records for which skip_record(record) is true are left out.
+        """
+        header = ""
+        parts, tokens, has_header = [], 0, False
+
+        def compose():
+            body = "\n".join(parts)
+            if header and not has_header:
+                return f"Statement header (context only, do not output it as transactions):\n{header}\n\nTransactions:\n{body}"
+            return body
+
+        for kind, text in self.iter_statement_records(texts):
+            if not text or (kind == "transaction" and skip_record is not None and skip_record(text)):
+                continue
+            if kind == "header":
+                header = text
+            record_tokens = estimate_prompt_tokens(text)
+            context_tokens = 0 if has_header or kind == "header" else estimate_prompt_tokens(header)
+            if parts and tokens + context_tokens + record_tokens > token_budget:
+                yield compose()
+                parts, tokens, has_header = [], 0, False
+            parts.append(text)
+            tokens += record_tokens
+            has_header = has_header or kind == "header"
+        if parts:
+            yield compose()
+
+    def split_text_into_chunks(self, text, token_budget=EXPENSE_CHUNK_TOKEN_BUDGET):
         print("✂️ Metin parçalara bölünüyor...")
-        chunks = []
-        current = ""
-        for line in text.splitlines():
-            if len(current) + len(line) < max_chars:
-                current += line + "\n"
-            else:
-                chunks.append(current.strip())
-                current = line + "\n"
-        if current.strip():
-            chunks.append(current.strip())
+        chunks = list(self.iter_chunks([text], token_budget))
         print(f"📦 {len(chunks)} adet parça oluşturuldu.")
         return chunks
 
-    def categorize_pdf(self, pdf_file) -> dict:
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, pdf_file.filename)
+    @staticmethod
+    def transaction_key(t):
+        amount = parse_minor(t.get("amount"))
+        description = " ".join(str(t.get("description") or "").upper().split())
+        return (str(t.get("date") or "").strip(), abs(amount) if amount is not None else t.get("amount"), description, t.get("flow"))
+
+    def categorize_chunk(self, index, chunk):
+        """Returns (parsed_json_or_None, input_tokens, output_tokens) for one chunk."""
+        print(f"🤖 Gemini ile işleniyor: Parça {index+1}")
+        response = self.call_model("Şu metni dönüştür:\n" + chunk, model=self.json_model, priority=PRIORITY_BATCH)
+        # Token kullanımını topla
+        input_tokens = output_tokens = 0
+        if hasattr(response, "usage_metadata"):
+            usage = response.usage_metadata
+            input_tokens = usage.prompt_token_count
+            output_tokens = usage.candidates_token_count
+
+        if not response.text:
+            print("⚠️ Uyarı: Boş yanıt döndü. Bu parça atlanacak.")
+            return None, input_tokens, output_tokens
 
         try:
-            print("📥 PDF dosyası geçici klasöre kaydediliyor...")
-            pdf_file.save(temp_path)
-
-            job_status["static-track-id"].setdefault("steps", []).append("Saving uploaded PDF to temporary directory...")
-            job_status["static-track-id"]["step"] = "Saving uploaded PDF to temporary directory..."
-
-            print(f"🗂️ Kaydedilen dosya: {temp_path}")
-
-            job_status["static-track-id"].setdefault("steps", []).append("Extracting text from PDF...")
-            job_status["static-track-id"]["step"] = "Extracting text from PDF..."
-
-            text = self.extract_text_from_pdf(temp_path)
-
-            if not text.strip():
+            parsed = json.loads(response.text)
+        except Exception as e:
+            print(f"❌ JSON çözümleme hatası: {str(e)}")
+            return None, input_tokens, output_tokens
+
+        if not parsed or not isinstance(parsed, dict):
+            print("⚠️ Geçersiz JSON formatı. Atlanıyor...")
+            return None, input_tokens, output_tokens
+        return parsed, input_tokens, output_tokens
+
+    def categorize_chunks(self, chunks, job_id=None):
+        """
+        Categorizes chunks from any iterable with bounded concurrency and returns
+        the results in chunk order. The next chunk is only pulled once a worker is
+        free, so a lazy chunk source keeps at most a few chunks in memory.
+        """
+        results = []
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                i = pending.pop(future)
+                results[i] = future.result()
+                job_status.add_step(job_id, f"Chunk {i+1} categorized ({len(results) - len(pending)}/{len(results)} chunks read so far).")
+
+        with ThreadPoolExecutor(max_workers=max(1, EXPENSE_CHUNK_CONCURRENCY), thread_name_prefix="expense-chunk") as pool:
+            for i, chunk in enumerate(chunks):
+                if len(pending) >= max(1, EXPENSE_CHUNK_CONCURRENCY):
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                results.append(None)
+                pending[pool.submit(self.categorize_chunk, i, chunk)] = i
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        print(f"📦 {len(results)} adet parça işlendi.")
+        return results
+
+    def categorize_pdf(self, pdf_file, job_id=None, user_key=None) -> dict:
+        """
+        Analyzes one uploaded statement. Known layouts are parsed locally and
+        only uncached merchants go to the model. Other layouts are transformed
+        by the model as a whole (it extracts the lines too, so the call cannot
+        be skipped); the merchant cache then overrides its category guesses
+        and learns the rest.
+        """
+        upload = None
+        # Kullanıcının daha önce yüklediği işlemler yeniden kategorize edilmez (çakışan ekstre dönemleri)
+        ingestion = None
+        if user_key:
+            ingestion = get_transaction_index().session(user_key)
+        try:
+            # Yükleme bir kez okunur: küçük dosyalar bellekte kalır, büyükler benzersiz geçici dosyaya taşar
+            print("📥 PDF yüklemesi belleğe alınıyor...")
+            upload = BufferedUpload(pdf_file)
+
+            job_status.add_step(job_id, "Reading uploaded PDF...")
+            print(f"🗂️ {upload.filename}: {upload.size} bayt ({'bellekte' if upload.in_memory else 'geçici dosyada'})")
+
+            # Aynı dosya daha önce analiz edildiyse (tekrar deneme, UI hatası) sonuç doğrudan önbellekten döner
+            digest = upload.sha256
+            cached_output = get_result_cache().get(digest)
+            if cached_output is not None:
+                print(f"♻️ Aynı ekstre önbellekte bulundu: {digest[:12]}")
+                job_status.add_step(job_id, "Identical statement found in cache. Returning cached analysis.")
+                job_status.update(job_id, cache_hit=True, cost=self.calculate_token_cost(0, 0))
+                if ingestion is not None:
+                    cached_transactions = cached_output.get("transactions") or []
+                    ingestion.partition([dict(t) for t in cached_transactions])
+                    ingestion.commit(cached_transactions)
+                    cached_output["ingestion"] = ingestion.report(len(cached_transactions))
+                    job_status.update(job_id, ingestion=cached_output["ingestion"])
+                return cached_output
+            job_status.update(job_id, cache_hit=False)
+
+            # Önce bilinen ekstre düzenleri denenir; tanınmazsa tüm metin Gemini'ye dönüştürülmek üzere gönderilir
+            results = self.parse_statement_locally(upload, job_id, ingestion)
+            parsed_locally = results is not None
+            if not parsed_locally:
+                # Sayfa çıkarma → parçalama → Gemini: parçalar doldukça gönderilir, sonraki sayfalar bu sırada okunur.
+                # Daha önce alınmış işlem satırları Gemini'ye hiç gönderilmez, kayıtlı halleri çıktıya eklenir.
+                job_status.add_step(job_id, "Extracting text and sending chunks to Gemini for categorization...")
+                skip_record = ingestion.match_record if ingestion is not None else None
+                chunks = self.iter_chunks(self.iter_pdf_pages(upload), skip_record=skip_record)
+                results = self.categorize_chunks(chunks, job_id)
+
+            restored = ingestion.restored if ingestion is not None else []
+            if not results and not restored:
                 raise ValueError("📭 PDF boş veya metin içeremiyor.")
 
-            job_status["static-track-id"].setdefault("steps", []).append("Splitting text into chunks for processing...")
-            job_status["static-track-id"]["step"] = "Splitting text into chunks for processing..."
-
-            chunks = self.split_text_into_chunks(text, max_chars=5000)
-
-            job_status["static-track-id"].setdefault("steps", []).append("Sending chunks to Gemini for categorization...")
-            job_status["static-track-id"]["step"] = "Sending chunks to Gemini for categorization..."
-
+            # Sonuçlar orijinal parça sırasıyla birleştirilir; ilk geçerli müşteri / limit bilgisi seçilir.
+            # Birden fazla parçada görünen işlem (tarih, tutar, açıklama, yön) bir kez sayılır; aynı parçadaki
+            # gerçek tekrarlar (ör. aynı gün iki eşit ödeme) korunur.
             all_transactions = []
+            kept_keys = Counter()
+            duplicates = 0
             first_card_limit = None
             first_customer_info = None
             total_input_tokens = 0
             total_output_tokens = 0
-            for i, chunk in enumerate(chunks):
-                print(f"🤖 Gemini ile işleniyor: Parça {i+1}/{len(chunks)}")
-                response = self.json_model.generate_content("Şu metni dönüştür:\n" + chunk)
-                # Token kullanımını topla
-                if hasattr(response, "usage_metadata"):
-                    usage = response.usage_metadata
-                    total_input_tokens += usage.prompt_token_count
-                    total_output_tokens += usage.candidates_token_count
-                #DEBUG LOG!
-                #print("📤 Gemini yanıtı:")
-                #print(repr(response.text))
-
-                if not response.text:
-                     print("⚠️ Uyarı: Boş yanıt döndü. Bu parça atlanacak.")
-                     continue
-
-                # 1. Eğer response.text gerçekten bir string ise:
-                if isinstance(response.text, str):
-                    try:
-                        parsed = json.loads(response.text)
-                    except Exception as e:
-                        print(f"❌ JSON çözümleme hatası: {str(e)}")
-                        continue
-
-                # 2. Eğer response.text zaten dict gibi görünüyorsa (örneğin response json geliyor olabilir):
-                elif isinstance(response.text, dict):
-                    parsed = response.text
-
-                if not parsed or not isinstance(parsed, dict):
-                    print("⚠️ Geçersiz JSON formatı. Atlanıyor...")
+            for parsed, input_tokens, output_tokens in results:
+                total_input_tokens += input_tokens
+                total_output_tokens += output_tokens
+                if parsed is None:
                     continue
 
                 customer = parsed.get("customer_info")
                 if isinstance(customer, dict) and customer.get("full_name") and not first_customer_info:
-                     first_customer_info = customer
-                
+                    first_customer_info = customer
+
                 card = parsed.get("card_limit")
                 if isinstance(card, dict) and (card.get("total_card_limit") or card.get("remaining_card_limit")) and not first_card_limit:
                     first_card_limit = card
 
-
-                
                 transactions = parsed.get("transactions")
                 if transactions and isinstance(transactions, list):
-                     all_transactions.extend(transactions)
+                    chunk_keys = Counter()
+                    for t in transactions:
+                        if not isinstance(t, dict):
+                            continue
+                        key = self.transaction_key(t)
+                        chunk_keys[key] += 1
+                        if chunk_keys[key] <= kept_keys[key]:
+                            duplicates += 1
+                            continue
+                        kept_keys[key] += 1
+                        all_transactions.append(t)
                 else:
-                     print(f"⚠️ Uyarı: transactions alanı eksik, None veya liste değil. Parça atlandı.")
-                     continue
-
-                job_status["static-track-id"].setdefault("steps", []).append(f"Chunk {i+1}/{len(chunks)} categorized.")
-                job_status["static-track-id"]["step"] = f"Chunk {i+1}/{len(chunks)} categorized."
-
+                    print(f"⚠️ Uyarı: transactions alanı eksik, None veya liste değil. Parça atlandı.")
+
+            if duplicates:
+                print(f"🧹 Parçalar arasında tekrarlanan {duplicates} işlem çıkarıldı.")
+
+            # Tam dönüştürme yolunda kategoriyi de LLM verir: önbellekte bilinen işletmeler onun tahmininin
+            # yerine geçer, geçerli yeni kategoriler önbelleğe yazılır
+            if not parsed_locally:
+                self.apply_merchant_cache(all_transactions, job_id)
+            if restored:
+                print(f"⏭️ Daha önce alınmış {len(restored)} işlem Gemini'ye gönderilmedi.")
+                all_transactions.extend(dict(t) for t in restored)
             print(f"💳 Toplam işlem sayısı: {len(all_transactions)}")
 
-            job_status["static-track-id"].setdefault("steps", []).append("Normalizing amounts and calculating category totals...")
-            job_status["static-track-id"]["step"] = "Normalizing amounts and calculating category totals..."
-
-            for t in all_transactions:
-                raw_amount = t.get("amount", "")
-                try:
-                    amount_number = float(
-                        raw_amount.replace(".", "").replace(",", ".").replace(" TL", "").replace("-", "").strip()
-                    )
-                    t["amount"] = f"{amount_number:,.2f} TL".replace(",", "X").replace(".", ",").replace("X", ".")
-                except (ValueError, TypeError):
-                    pass
-
-            all_category_totals = {}
-            for t in all_transactions:
-                if t.get("flow") != "spending":
+            job_status.add_step(job_id, "Normalizing amounts and calculating category totals...")
+            # Tek geçiş: tutarlar bir kez kuruşa çevrilir, toplamlar tamsayıyla tutulur, metin yalnızca çıktıda üretilir
+            category_minor = {}
+            unparsed = 0
+            for t, (minor, text) in zip(all_transactions, normalize_many(t.get("amount") for t in all_transactions)):
+                if minor is None:
+                    unparsed += 1
                     continue
-                cat = t.get("spending_category")
-                amount_str = t.get("amount", "0,00 TL")
-                try:
-                    val = float(amount_str.replace(".", "").replace(",", ".").replace(" TL", ""))
-                    prev_val = float(all_category_totals.get(cat, "0,00 TL").replace(".", "").replace(",", ".").replace(" TL", ""))
-                    total = val + prev_val
-                    formatted = f"{total:,.2f} TL".replace(",", "X").replace(".", ",").replace("X", ".")
-                    all_category_totals[cat] = formatted
-                except:
-                    pass
+                t["amount"] = text
+                if t.get("flow") == "spending":
+                    cat = t.get("spending_category")
+                    category_minor[cat] = category_minor.get(cat, 0) + minor
+            if unparsed:
+                print(f"⚠️ {unparsed} işlemin tutarı çözümlenemedi; toplamlara katılmadı.")
+
+            all_category_totals = {cat: format_minor(total) for cat, total in category_minor.items()}
 
             print("📊 Harcama kategorileri hesaplandı.")
 
@@ -311,27 +599,31 @@ class ExpenseAnalyzerAgent(Agent):
                 "transactions": all_transactions
             }
 
-            job_status["static-track-id"].setdefault("steps", []).append("Final output assembled. Analysis complete.")
-            job_status["static-track-id"]["step"] = "Final output assembled. Analysis complete."
-                        # Token cost hesaplama ve ekleme
-           
+            job_status.add_step(job_id, "Final output assembled. Analysis complete.")
 
             print("✅ PDF analiz işlemi tamamlandı.")
-            job_status["static-track-id"].setdefault("steps", []).append("Construction complete.")
-            job_status["static-track-id"]["step"] = "Construction complete."    
+            job_status.add_step(job_id, "Construction complete.")
             # Token cost hesapla
             token_cost = self.calculate_token_cost(total_input_tokens, total_output_tokens)
-            job_status["static-track-id"]["cost"] = token_cost
+            job_status.update(job_id, cost=token_cost)
+
+            if all_transactions:
+                get_result_cache().put(digest, final_output)
+
+            # Önbelleğe alınan analiz kullanıcıdan bağımsızdır; alım raporu yalnızca bu yanıta eklenir
+            if ingestion is not None:
+                ingestion.commit(all_transactions)
+                final_output["ingestion"] = ingestion.report(len(all_transactions))
+                job_status.update(job_id, ingestion=final_output["ingestion"])
 
             return final_output
 
         except Exception as e:
-            job_status["static-track-id"].setdefault("steps", []).append("Error occurred during PDF analysis.")
-            job_status["static-track-id"]["step"] = "Error occurred during PDF analysis."
+            job_status.add_step(job_id, "Error occurred during PDF analysis.")
             print("🚫 Genel hata:", e)
             raise
 
         finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                print("🧹 Geçici dosya silindi.")
+            if upload is not None:
+                upload.close()
+                print("🧹 Yükleme arabelleği kapatıldı.")
@@ -5,8 +5,9 @@ import matplotlib
 matplotlib.use("Agg")  #
 from fpdf import FPDF
 import tempfile
-import google.generativeai as genai
 from dotenv import load_dotenv
+from agents.baseAgent import get_model, call_llm
+from agents.money import parse_minor_many, minor_to_float
 import unicodedata
 
 # Kullanıcıya gösterilecek tüm metinleri Latin-1 karakter setine uyarlayan fonksiyon Türkçe karakterlerdeki sorunu kaldırmak için
@@ -17,18 +18,13 @@ def normalize_text(text):
 
 # Ortam değişkenlerinden API anahtarını yükler
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=api_key)
-
-llm_model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    generation_config={
-        "temperature": 0.4,
-        "top_p": 0.95,
-        "top_k": 64,
-        "max_output_tokens": 2048
-    }
-)
+
+SUMMARY_GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 2048
+}
 
 # LLM ile transaction verisinden metinsel özet üretir
 def generate_summary_from_transactions(data):
@@ -43,7 +39,7 @@ Please start your summary like this:
 JSON:
 {json.dumps(data, indent=2)}
 """
-    response = llm_model.generate_content(prompt)
+    response = call_llm(get_model(generation_config=SUMMARY_GENERATION_CONFIG), prompt, agent="ExportReport")
     return response.text.strip()
 
 # Kullanıcı bilgisine göre kişisel bir giriş paragrafı hazırlar
@@ -59,14 +55,11 @@ def generate_intro_from_user_info(user_info):
 def generate_pie_chart(category_totals):
     labels = []
     values = []
-    for cat, amount in category_totals.items():
-        try:
-            val = float(amount.replace(".", "").replace(",", ".").replace(" TL", ""))
-            label = normalize_text(cat.replace("_", " ").title())
-            labels.append(label)
-            values.append(val)
-        except:
+    for (cat, amount), minor in zip(category_totals.items(), parse_minor_many(category_totals.values())):
+        if minor is None or not isinstance(cat, str):
             continue
+        labels.append(normalize_text(cat.replace("_", " ").title()))
+        values.append(minor_to_float(minor))
 
     fig, ax = plt.subplots()
     ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90)
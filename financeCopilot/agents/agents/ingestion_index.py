@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import Counter
+
+from agents.baseAgent import cache_path
+from agents.merchant_cache import ascii_fold
+from agents.money import parse_minor
+
+INGESTION_DB_PATH = os.getenv("INGESTION_DB_PATH") or cache_path("ingested_transactions.sqlite3")
+# Ham satırla eşleşme için açıklamanın en az bu kadar karakteri olmalı
+MIN_MATCH_DESCRIPTION_CHARS = 4
+
+_DATE_RE = re.compile(r"(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})")
+_MONEY_TOKEN_RE = re.compile(r"\d{1,3}(?:\.\d{3})*,\d{2}|\d+\.\d{2}")
+_NON_ALNUM_RE = re.compile(r"[^A-Z0-9]+")
+
+
+def normalize_date(value):
+    """Returns the first date in value as DD/MM/YYYY ("7.5.25" -> "07/05/2025"), or None."""
+    match = _DATE_RE.search(str(value or ""))
+    if not match:
+        return None
+    day, month, year = match.groups()
+    if len(year) == 2:
+        year = "20" + year
+    return f"{int(day):02d}/{int(month):02d}/{year}"
+
+
+def compact_description(description):
+    """Upper-case ASCII letters and digits only, so "MIGROS ZIYA GOKALP" and "MIGROSZIYAGOKALP" agree."""
+    return _NON_ALNUM_RE.sub("", ascii_fold(description).upper())
+
+
+def transaction_fingerprint(t):
+    """Fingerprint of (normalized date, absolute amount, compact description), or None if incomplete."""
+    date = normalize_date(t.get("date"))
+    amount = parse_minor(t.get("amount"))
+    description = compact_description(t.get("description"))
+    if date is None or amount is None or not description:
+        return None
+    return hashlib.sha1(f"{date}|{abs(amount)}|{description}".encode("utf-8")).hexdigest()
+
+
+class TransactionIndex:
+    """
+    Per-user index of already-ingested transactions, backed by SQLite. A
+    fingerprint that legitimately repeats (two equal coffees on the same day)
+    is stored once per occurrence, so overlapping statements skip exactly the
+    transactions seen before.
+    """
+
+    def __init__(self, db_path=INGESTION_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingested_transactions (
+                user_key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                occurrence INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                amount_minor INTEGER NOT NULL,
+                compact TEXT NOT NULL,
+                transaction_json TEXT NOT NULL,
+                ingested_at REAL NOT NULL,
+                PRIMARY KEY (user_key, fingerprint, occurrence)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ingested_user_date ON ingested_transactions (user_key, date)")
+        self._conn.commit()
+        self.skipped = 0
+        self.ingested = 0
+
+    def entries(self, user_key, fingerprints):
+        """Returns {fingerprint: [stored transaction, ...]} ordered by occurrence."""
+        wanted = sorted(set(fingerprints))
+        found = {}
+        with self._lock:
+            for i in range(0, len(wanted), 500):
+                batch = wanted[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT fingerprint, transaction_json FROM ingested_transactions "
+                    f"WHERE user_key = ? AND fingerprint IN ({','.join('?' * len(batch))}) ORDER BY occurrence",
+                    [user_key, *batch],
+                ).fetchall()
+                for fingerprint, transaction_json in rows:
+                    found.setdefault(fingerprint, []).append(json.loads(transaction_json))
+        return found
+
+    def entries_for_date(self, user_key, date):
+        """Returns [(fingerprint, occurrence, amount_minor, compact, transaction)] ingested on a date."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fingerprint, occurrence, amount_minor, compact, transaction_json FROM ingested_transactions "
+                "WHERE user_key = ? AND date = ? ORDER BY fingerprint, occurrence",
+                (user_key, date),
+            ).fetchall()
+        return [(f, o, a, c, json.loads(t)) for f, o, a, c, t in rows]
+
+    def add(self, user_key, transactions):
+        """
+        Records an upload's transactions. Idempotent: a fingerprint seen n times
+        in the upload and m times in the index adds only the n - m new occurrences.
+        Returns the number of rows added.
+        """
+        by_fingerprint = {}
+        for t in transactions:
+            fingerprint = transaction_fingerprint(t)
+            if fingerprint:
+                by_fingerprint.setdefault(fingerprint, []).append(t)
+        if not by_fingerprint:
+            return 0
+
+        existing = Counter({f: len(stored) for f, stored in self.entries(user_key, by_fingerprint).items()})
+        now = time.time()
+        rows = []
+        for fingerprint, items in by_fingerprint.items():
+            for occurrence in range(existing[fingerprint], len(items)):
+                t = items[occurrence]
+                rows.append((
+                    user_key, fingerprint, occurrence, normalize_date(t.get("date")), abs(parse_minor(t.get("amount"))),
+                    compact_description(t.get("description")), json.dumps(t, ensure_ascii=False), now,
+                ))
+        if rows:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO ingested_transactions "
+                    "(user_key, fingerprint, occurrence, date, amount_minor, compact, transaction_json, ingested_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+                self.ingested += len(rows)
+        return len(rows)
+
+    def session(self, user_key):
+        return IngestionSession(self, user_key)
+
+    def stats(self):
+        with self._lock:
+            users, size = self._conn.execute(
+                "SELECT COUNT(DISTINCT user_key), COUNT(*) FROM ingested_transactions"
+            ).fetchone()
+            return {"users": users, "transactions": size, "skipped": self.skipped, "ingested": self.ingested}
+
+
+class IngestionSession:
+    """
+    One upload's view of a user's index. Each stored occurrence can be claimed
+    once, whether by a parsed transaction (partition) or a raw statement record
+    (match_record), so repeats beyond what was ingested before count as new.
+    """
+
+    def __init__(self, index, user_key):
+        self.index = index
+        self.user_key = user_key
+        self.skipped = 0
+        # match_record ile atlanan ham satırların kayıtlı karşılıkları (çıktıya geri eklenir)
+        self.restored = []
+        self._claimed = set()
+        self._by_date = {}
+
+    def _claim(self, fingerprint, occurrence):
+        if (fingerprint, occurrence) in self._claimed:
+            return False
+        self._claimed.add((fingerprint, occurrence))
+        self.skipped += 1
+        with self.index._lock:
+            self.index.skipped += 1
+        return True
+
+    def partition(self, transactions):
+        """
+        Splits parsed transactions into (new, known). Known ones get, in place,
+        the spending_category assigned when they were first ingested.
+        """
+        fingerprints = [transaction_fingerprint(t) for t in transactions]
+        stored = self.index.entries(self.user_key, [f for f in fingerprints if f])
+        new, known = [], []
+        for t, fingerprint in zip(transactions, fingerprints):
+            match = None
+            for occurrence, entry in enumerate(stored.get(fingerprint, ())):
+                if self._claim(fingerprint, occurrence):
+                    match = entry
+                    break
+            if match is None:
+                new.append(t)
+            else:
+                t["spending_category"] = match.get("spending_category")
+                known.append(t)
+        return new, known
+
+    def match_record(self, record):
+        """
+        True if a raw statement record (a dated line plus continuation lines) is
+        an already-ingested transaction: same date, one of its amounts equal and
+        the stored description contained in it. The stored transaction is kept in
+        self.restored so the caller can put it back into the output.
+        """
+        date = normalize_date(record[:12])
+        if date is None:
+            return False
+        if date not in self._by_date:
+            self._by_date[date] = self.index.entries_for_date(self.user_key, date)
+        entries = self._by_date[date]
+        if not entries:
+            return False
+
+        amounts = {abs(m) for m in map(parse_minor, _MONEY_TOKEN_RE.findall(record)) if m is not None}
+        compact = compact_description(record)
+        for fingerprint, occurrence, amount_minor, description, transaction in entries:
+            if (
+                amount_minor in amounts
+                and len(description) >= MIN_MATCH_DESCRIPTION_CHARS
+                and description in compact
+                and self._claim(fingerprint, occurrence)
+            ):
+                self.restored.append(transaction)
+                return True
+        return False
+
+    def commit(self, transactions):
+        """Adds the upload's transactions to the index (only occurrences not already there)."""
+        return self.index.add(self.user_key, transactions)
+
+    def report(self, total):
+        return {"total": total, "new": max(total - self.skipped, 0), "skipped": self.skipped}
+
+
+_transaction_index = None
+_transaction_index_lock = threading.Lock()
+
+
+def get_transaction_index():
+    # SQLite dosyası ilk kullanımda açılır
+    global _transaction_index
+    if _transaction_index is None:
+        with _transaction_index_lock:
+            if _transaction_index is None:
+                _transaction_index = TransactionIndex()
+    return _transaction_index
@@ -2,11 +2,9 @@ from agents.baseAgent import Agent
 from agents.job_tracking import job_status
 import os
 import json
+import asyncio
 import httpx
 from dotenv import load_dotenv
-import numpy as np  # ensure numpy is imported at the top
-import google.generativeai as genai
-from financeAgent.newsGetter import NewsAnalyzer
 load_dotenv()
 BACKEND_URL = os.getenv("BACKEND_URL")
 
@@ -86,23 +84,19 @@ Analyze the data and complete the following:
 class InvestmentAdvisorAgent(Agent):
     def __init__(self, name, role):
         super().__init__(name="Investment Advice Agent", role=investmentAdvisorAgentRole)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
-            },
-            system_instruction=self.role,
-        )
-        self.news_analyzer = NewsAnalyzer()
+        self._news_analyzer = None
+
+    # finnhub istemcisi yalnızca yatırım tavsiyesi istendiğinde yüklenir
+    @property
+    def news_analyzer(self):
+        if self._news_analyzer is None:
+            from financeAgent.newsGetter import NewsAnalyzer
+            self._news_analyzer = NewsAnalyzer()
+        return self._news_analyzer
 
-    def get_current_market_prices(self, file_path: str):
+    def get_current_market_prices(self, file_path: str, job_id=None):
         symbol_to_price = {}
-        job_status["static-track-id"].setdefault("steps", []).append("Reading current market prices...")
-        job_status["static-track-id"]["step"] = "Reading current market prices..."
+        job_status.add_step(job_id, "Reading current market prices...")
         with open(file_path, "r") as f:
             for line in f:
                 line = line.strip()
@@ -117,6 +111,8 @@ class InvestmentAdvisorAgent(Agent):
         return symbol_to_price
 
     def calculate_annualized_volatility(self,closes):
+        import numpy as np
+
         if len(closes) < 2:
             return 0.0
         returns = np.log(np.array(closes[1:]) / np.array(closes[:-1]))
@@ -124,28 +120,23 @@ class InvestmentAdvisorAgent(Agent):
         return round(daily_volatility * np.sqrt(252), 2)
     
     
-    def give_summary_lines(self):
+    def give_summary_lines(self, job_id=None):
         # Step 1: Get the current market prices
-        job_status["static-track-id"].setdefault("steps", []).append("Reading current market prices...")
-        job_status["static-track-id"]["step"] = "Reading current market prices..."
-        current_prices = self.get_current_market_prices("./agents/financeAgent/market_prices_output.txt")
+        job_status.add_step(job_id, "Reading current market prices...")
+        current_prices = self.get_current_market_prices("./agents/financeAgent/market_prices_output.txt", job_id)
 
         # Step 2: Load historical data
         with open("./agents/financeAgent/historical_data.json", "r", encoding="utf-8") as file:
             stock_data = json.load(file)
 
-        job_status["static-track-id"].setdefault("steps", []).append("Filtering low-risk stock candidates...")
-        job_status["static-track-id"]["step"] = "Filtering low-risk stock candidates..."
-
+        job_status.add_step(job_id, "Filtering low-risk stock candidates...")
         # Step 3: Summarize each stock
         low_risk_candidates= []
         for s in stock_data:
             if(s["volatility"] < 35 and s["growth_pct"] > 0):
                 low_risk_candidates.append(s)
 
-        job_status["static-track-id"].setdefault("steps", []).append("Selecting top low-risk stocks for summary...")
-        job_status["static-track-id"]["step"] = "Selecting top low-risk stocks for summary..."
-
+        job_status.add_step(job_id, "Selecting top low-risk stocks for summary...")
         # Step 5: Select top 10 by lowest volatility
         selected = sorted(low_risk_candidates, key=lambda x: x["volatility"])[:5]
 
@@ -156,14 +147,11 @@ class InvestmentAdvisorAgent(Agent):
             symbol = s["symbol"]
             s["today_price"] = current_prices.get(symbol, "N/A")
 
-            job_status["static-track-id"].setdefault("steps", []).append(f"Analyzing news for {symbol}...")
-            job_status["static-track-id"]["step"] = f"Analyzing news for {symbol}..."
-
+            job_status.add_step(job_id, f"Analyzing news for {symbol}...")
             try:
                 news_summary = self.news_analyzer.analyze_news(symbol)
             except Exception as e:
-                job_status["static-track-id"].setdefault("steps", []).append(f"News analysis failed for {symbol}")
-                job_status["static-track-id"]["step"] = f"News analysis failed for {symbol}"
+                job_status.add_step(job_id, f"News analysis failed for {symbol}")
                 print(f"⚠️ News analysis failed for {symbol}: {e}")
                 news_summary = {
                     "overview": "Unavailable",
@@ -194,14 +182,12 @@ News URL: {", ".join(news_summary.get("URL", []))}
 ---------------------------------------------------------
 """
 
-        job_status["static-track-id"].setdefault("steps", []).append("Stock summary complete. Preparing final response...")
-        job_status["static-track-id"]["step"] = "Stock summary complete. Preparing final response..."
-        
+        job_status.add_step(job_id, "Stock summary complete. Preparing final response...")
         return summary_lines
 
-    async def get_financal_advise(self, user_message,user):
+    async def get_financal_advise(self, user_message,user, job_id=None, on_chunk=None):
         userS = json.loads(user)
-        summery_lines = self.give_summary_lines()
+        summery_lines = await asyncio.to_thread(self.give_summary_lines, job_id)
         # Map user fields from the 'fields' array to a flat dictionary
         field_map = {f["name"].lower(): f["content"] for f in userS.get("fields", [])}
 
@@ -226,16 +212,14 @@ News URL: {", ".join(news_summary.get("URL", []))}
             + summery_lines
         )
 
-        job_status["static-track-id"].setdefault("steps", []).append("Generating investment advice using Gemini...")
-        job_status["static-track-id"]["step"] = "Generating investment advice using Gemini..."
+        job_status.add_step(job_id, "Generating investment advice using Gemini...")
         print(prompt)
-        response = self.model.generate_content(prompt)
+        response = await self.call_model_async(prompt, on_chunk=on_chunk)
         if hasattr(response, "usage_metadata"): 
             usage = response.usage_metadata
             input_tokens = usage.prompt_token_count
             output_tokens = usage.candidates_token_count
             token_cost = self.calculate_token_cost(input_tokens, output_tokens)
-            job_status["static-track-id"]["cost"] = token_cost    
-        job_status["static-track-id"].setdefault("steps", []).append("Construction complete.")
-        job_status["static-track-id"]["step"] = "Construction complete."
+            job_status.update(job_id, cost=token_cost)
+        job_status.add_step(job_id, "Construction complete.")
         return json.loads(response.text.strip())
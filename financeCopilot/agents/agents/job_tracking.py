@@ -1 +1,274 @@
-job_status = {}
\ No newline at end of file
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+
+JOB_STORE_MAX_JOBS = int(os.getenv("JOB_STORE_MAX_JOBS", "1000"))
+JOB_STORE_TTL_SECONDS = int(os.getenv("JOB_STORE_TTL_SECONDS", "3600"))
+MAX_STEPS_PER_JOB = int(os.getenv("MAX_STEPS_PER_JOB", "50"))
+SSE_KEEPALIVE_SECONDS = 15
+# İstemci aboneliği /chat isteğinden önce açabilir; iş bu süre içinde oluşmazsa akış kapanır
+SSE_WAIT_FOR_START_SECONDS = 60
+
+# Frontend bu durumları görünce takibi bırakır
+TERMINAL_STATUSES = ("done", "failed")
+
+_JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def resolve_job_id(candidate):
+    # İstemci kendi ürettiği id'yi gönderebilir (SSE aboneliğini /chat yanıtından önce açmak için);
+    # var olan bir işin id'si kabul edilmez, böylece başka bir isteğin ilerlemesi ele geçirilemez
+    if isinstance(candidate, str) and _JOB_ID_PATTERN.match(candidate) and candidate not in job_status:
+        return candidate
+    return new_job_id()
+
+
+# Sunucu içi okumalar (ör. batch maliyet toplama) sahip kontrolüne takılmaz
+_ANY_REQUESTER = object()
+
+
+class JobStore:
+    """
+    Thread-safe, bounded job status store with LRU + TTL eviction.
+
+    Each job keeps a version counter that is bumped on every change so
+    SSE streams can wait for the next update instead of polling. A job
+    created with an owner (user key) is only visible to that requester.
+    """
+
+    def __init__(self, max_jobs=JOB_STORE_MAX_JOBS, ttl_seconds=JOB_STORE_TTL_SECONDS, max_steps=MAX_STEPS_PER_JOB):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.max_steps = max_steps
+        # job_id -> {"touched": float, "version": int, "owner": str | None, "job": dict}
+        self._jobs = OrderedDict()
+        self._listeners = {}
+        self._cond = threading.Condition()
+
+    def _evict(self, now):
+        while self._jobs:
+            oldest_id, entry = next(iter(self._jobs.items()))
+            if len(self._jobs) > self.max_jobs or now - entry["touched"] > self.ttl_seconds:
+                del self._jobs[oldest_id]
+            else:
+                break
+
+    def _touch(self, job_id, now):
+        entry = self._jobs[job_id]
+        entry["touched"] = now
+        self._jobs.move_to_end(job_id)
+        return entry
+
+    def _changed(self, job_id, entry):
+        entry["version"] += 1
+        self._cond.notify_all()
+        return list(self._listeners.get(job_id, ()))
+
+    @staticmethod
+    def _notify(listeners):
+        # Dinleyiciler kilit dışında çağrılır; asyncio tarafı call_soon_threadsafe kullanır
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"⚠️ Job listener error: {e}")
+
+    def create(self, job_id, owner=None, **fields):
+        """
+        Creates a job and returns its id. An existing job is never replaced:
+        if job_id is taken, a fresh server-side id is used instead.
+        """
+        now = time.time()
+        job = {"steps": []}
+        job.update(fields)
+        with self._cond:
+            self._evict(now)
+            if job_id in self._jobs:
+                job_id = new_job_id()
+            self._jobs[job_id] = {"touched": now, "version": 0, "owner": owner, "job": job}
+            self._evict(now)
+            listeners = self._changed(job_id, self._jobs[job_id]) if job_id in self._jobs else []
+        self._notify(listeners)
+        return job_id
+
+    @staticmethod
+    def _visible(entry, requester):
+        # Sahipsiz (anonim) işler id'yi bilen herkese, sahipli işler yalnızca sahibine açıktır
+        return entry is not None and (requester is _ANY_REQUESTER or entry["owner"] is None or entry["owner"] == requester)
+
+    def get(self, job_id, default=None, requester=_ANY_REQUESTER):
+        now = time.time()
+        with self._cond:
+            self._evict(now)
+            if not self._visible(self._jobs.get(job_id), requester):
+                return default
+            return self._snapshot(self._touch(job_id, now))
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def __len__(self):
+        with self._cond:
+            self._evict(time.time())
+            return len(self._jobs)
+
+    @staticmethod
+    def _snapshot(entry):
+        job = dict(entry["job"])
+        job["steps"] = list(job.get("steps", []))
+        return job
+
+    def update(self, job_id, **fields):
+        if job_id is None:
+            return
+        now = time.time()
+        with self._cond:
+            if job_id not in self._jobs:
+                return
+            entry = self._touch(job_id, now)
+            entry["job"].update(fields)
+            listeners = self._changed(job_id, entry)
+        self._notify(listeners)
+
+    def add_step(self, job_id, step):
+        if job_id is None:
+            return
+        now = time.time()
+        with self._cond:
+            if job_id not in self._jobs:
+                return
+            entry = self._touch(job_id, now)
+            steps = entry["job"].setdefault("steps", [])
+            steps.append(step)
+            if len(steps) > self.max_steps:
+                del steps[: len(steps) - self.max_steps]
+            entry["job"]["step"] = step
+            listeners = self._changed(job_id, entry)
+        self._notify(listeners)
+
+    def finish(self, job_id, status, **fields):
+        self.update(job_id, status=status, **fields)
+
+    def version(self, job_id):
+        with self._cond:
+            entry = self._jobs.get(job_id)
+            return entry["version"] if entry else None
+
+    def wait_for_change(self, job_id, last_version, timeout, requester=_ANY_REQUESTER):
+        """
+        Blocks until the job's version differs from last_version or timeout expires.
+        Pass last_version=None to wait for a job that has not been created yet.
+        Returns (version, snapshot); snapshot is None on timeout or once the job is gone.
+        A job the requester may not see is treated as missing.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                entry = self._jobs.get(job_id)
+                if not self._visible(entry, requester):
+                    entry = None
+                version = entry["version"] if entry else None
+                if version != last_version:
+                    return version, self._snapshot(entry) if entry else None
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return version, None
+                self._cond.wait(remaining)
+
+    def add_listener(self, job_id, listener):
+        with self._cond:
+            self._listeners.setdefault(job_id, []).append(listener)
+
+    def remove_listener(self, job_id, listener):
+        with self._cond:
+            listeners = self._listeners.get(job_id)
+            if listeners and listener in listeners:
+                listeners.remove(listener)
+                if not listeners:
+                    del self._listeners[job_id]
+
+
+def sse_event(job):
+    return f"data: {json.dumps(job, ensure_ascii=False, default=str)}\n\n"
+
+
+SSE_KEEPALIVE = ": keep-alive\n\n"
+IDLE_STATUS = {"status": "idle", "step": "waiting for input"}
+
+job_status = JobStore()
+
+
+def iter_job_events(job_id, store=job_status, requester=None):
+    """
+    Blocking SSE generator for the Flask app: yields one event per job change
+    and stops once the job reaches a terminal status or disappears.
+    """
+    version = None
+    waited = 0
+    while True:
+        new_version, job = store.wait_for_change(job_id, version, SSE_KEEPALIVE_SECONDS, requester)
+        if job is None:
+            if new_version is None and version is not None:
+                yield sse_event(IDLE_STATUS)
+                return
+            if version is None:
+                waited += SSE_KEEPALIVE_SECONDS
+                if waited >= SSE_WAIT_FOR_START_SECONDS:
+                    yield sse_event(IDLE_STATUS)
+                    return
+            yield SSE_KEEPALIVE
+            continue
+        version = new_version
+        yield sse_event(job)
+        if job.get("status") in TERMINAL_STATUSES:
+            return
+
+
+async def aiter_job_events(job_id, store=job_status, requester=None):
+    """
+    Async counterpart of iter_job_events for the ASGI app. Waits on a store
+    listener instead of a thread so open streams don't hold executor workers.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def listener():
+        loop.call_soon_threadsafe(changed.set)
+
+    store.add_listener(job_id, listener)
+    try:
+        version = None
+        waited = 0
+        while True:
+            new_version, job = store.wait_for_change(job_id, version, 0, requester)
+            if job is not None:
+                version = new_version
+                yield sse_event(job)
+                if job.get("status") in TERMINAL_STATUSES:
+                    return
+                continue
+            if new_version is None and version is not None:
+                yield sse_event(IDLE_STATUS)
+                return
+
+            try:
+                await asyncio.wait_for(changed.wait(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if version is None:
+                    waited += SSE_KEEPALIVE_SECONDS
+                    if waited >= SSE_WAIT_FOR_START_SECONDS:
+                        yield sse_event(IDLE_STATUS)
+                        return
+                yield SSE_KEEPALIVE
+            changed.clear()
+    finally:
+        store.remove_listener(job_id, listener)
@@ -0,0 +1,136 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+_LITERAL_END = ",}]" + _WHITESPACE
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a single JSON document that arrives in chunks
+    (e.g. a streamed Gemini response).
+
+    feed() returns the values that became complete with that chunk as
+    (path, value) pairs, where path is a tuple of object keys / array indexes.
+    Only values up to max_depth are reported: every array item (e.g.
+    ("recommendations", 0)) and every scalar field (e.g. ("lifePlan", "goal")).
+    Values nested inside an already reported array item are not reported again.
+    """
+
+    def __init__(self, max_depth=3):
+        self.max_depth = max_depth
+        self.text = ""
+        self.pos = 0
+        self.done = False
+        self._stack = []
+        self._scalar = None
+
+    def feed(self, chunk):
+        events = []
+        self.text += chunk
+        while self.pos < len(self.text) and not self.done:
+            c = self.text[self.pos]
+            if self._scalar is not None and not self._consume_scalar(c, events):
+                self.pos += 1
+                continue
+            if self._scalar is None:
+                self._structural(c, events)
+            self.pos += 1
+        return events
+
+    # Returns True if c must still be handled as a structural character
+    def _consume_scalar(self, c, events):
+        scalar = self._scalar
+        if scalar["kind"] == "string":
+            if scalar["escape"]:
+                scalar["escape"] = False
+            elif c == "\\":
+                scalar["escape"] = True
+            elif c == '"':
+                self._scalar = None
+                self._complete(scalar, self.pos + 1, events)
+            return False
+
+        if c in _LITERAL_END:
+            self._scalar = None
+            self._complete(scalar, self.pos, events)
+            return True
+        return False
+
+    def _structural(self, c, events):
+        if c in _WHITESPACE:
+            return
+        if not self._stack:
+            # Kök değerden önceki gürültüyü (ör. ```json) atla
+            if c in "{[":
+                self._start_value(c, ())
+            return
+
+        frame = self._stack[-1]
+        if frame["kind"] == "{":
+            if frame["expect"] == "key":
+                if c == '"':
+                    self._scalar = {"kind": "string", "start": self.pos, "path": frame["path"], "is_key": True, "escape": False}
+                elif c == "}":
+                    self._close(events)
+            elif frame["expect"] == "colon":
+                if c == ":":
+                    frame["expect"] = "value"
+            elif frame["expect"] == "value":
+                self._start_value(c, frame["path"] + (frame["key"],))
+            elif frame["expect"] == "comma":
+                if c == ",":
+                    frame["expect"] = "key"
+                elif c == "}":
+                    self._close(events)
+        else:
+            if frame["expect"] == "value":
+                if c == "]":
+                    self._close(events)
+                else:
+                    frame["index"] += 1
+                    self._start_value(c, frame["path"] + (frame["index"],))
+            elif frame["expect"] == "comma":
+                if c == ",":
+                    frame["expect"] = "value"
+                elif c == "]":
+                    self._close(events)
+
+    def _start_value(self, c, path):
+        if c in "{[":
+            self._stack.append({"kind": c, "start": self.pos, "path": path, "key": None, "index": -1,
+                                "expect": "key" if c == "{" else "value"})
+        elif c == '"':
+            self._scalar = {"kind": "string", "start": self.pos, "path": path, "is_key": False, "escape": False}
+        else:
+            self._scalar = {"kind": "literal", "start": self.pos, "path": path, "is_key": False}
+
+    def _close(self, events):
+        frame = self._stack.pop()
+        self._complete({"start": frame["start"], "path": frame["path"], "is_key": False}, self.pos + 1, events)
+
+    def _complete(self, value_info, end, events):
+        raw = self.text[value_info["start"]:end]
+        if value_info["is_key"]:
+            frame = self._stack[-1]
+            frame["key"] = json.loads(raw)
+            frame["expect"] = "colon"
+            return
+
+        if self._stack:
+            self._stack[-1]["expect"] = "comma"
+        else:
+            self.done = True
+
+        path = value_info["path"]
+        if self._should_emit(path, raw):
+            try:
+                events.append((path, json.loads(raw)))
+            except json.JSONDecodeError:
+                pass
+
+    def _should_emit(self, path, raw):
+        if not path or len(path) > self.max_depth:
+            return False
+        if any(isinstance(p, int) for p in path[:-1]):
+            return False
+        return isinstance(path[-1], int) or raw[:1] not in "{["
@@ -1,14 +1,12 @@
 from agents.baseAgent import Agent        
 from agents.job_tracking import job_status
 import os
+import asyncio
 import httpx
 
 import requests
-from fastapi import FastAPI
 from dotenv import load_dotenv
-import google.generativeai as genai
 import json
-from langdetect import detect
 
 from dotenv import load_dotenv
 
@@ -17,8 +15,6 @@ load_dotenv()
 
 BACKEND_URL = os.getenv("BACKEND_URL")
 
-app = FastAPI()
-
 lifePlannerAgentRole = """
 You are a smart financial assistant helping users build a personal life plan.
 
@@ -96,17 +92,6 @@ NEVER:
 class LifePlannerAgent(Agent):
     def __init__(self, name, role):
         super().__init__(name="Budget Planner Agent", role=lifePlannerAgentRole)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
-            },
-            system_instruction=self.role,
-        )
 
     async def fetch_user_data(self,userId):
         async with httpx.AsyncClient() as client:
@@ -187,15 +172,15 @@ class LifePlannerAgent(Agent):
             profile[key] = value
         return profile        
 
-    async def get_life_plan(self, user_message,user):
+    async def get_life_plan(self, user_message,user, job_id=None, on_chunk=None):
+        from langdetect import detect
+
         user_language = detect(user_message)
-        job_status["static-track-id"].setdefault("steps", []).append("Detecting user language and preparing profile...")
-        job_status["static-track-id"]["step"] = "Detecting user language and preparing profile..."
+        job_status.add_step(job_id, "Detecting user language and preparing profile...")
         try:
             sessionUser= json.loads(user)
             user_data = await self.fetch_user_data(sessionUser["id"])
-            job_status["static-track-id"].setdefault("steps", []).append("Fetched user data. Parsing profile and macroeconomic indicators...")
-            job_status["static-track-id"]["step"] = "Fetched user data. Parsing profile and macroeconomic indicators..."
+            job_status.add_step(job_id, "Fetched user data. Parsing profile and macroeconomic indicators...")
             macro_data = await self.fetch_macro_data()
             parsed_profile = await self.parse_user_fields(user_data)
 
@@ -238,9 +223,7 @@ User Profile:
                 - Car Price Index: {car_price_index}    
                 - Housing Price Index: {housing_price_index}
                 """
-            job_status["static-track-id"].setdefault("steps", []).append("Generating prompt for Gemini...")
-            job_status["static-track-id"]["step"] = "Generating prompt for Gemini..."
-
+            job_status.add_step(job_id, "Generating prompt for Gemini...")
             instruction = f"""The user's message is in **{user_language.upper()}**.
             Respond in the same language the user asked the question.Please use the profile and macroeconomic data below to generate a realistic, step-by-step, time-based financial life plan."""
 
@@ -254,50 +237,41 @@ User Profile:
             """
 
             print(f"📎 Prompt sent to model:\n{prompt}")
-            job_status["static-track-id"].setdefault("steps", []).append("Calling Agent to generate financial life plan...")
-            job_status["static-track-id"]["step"] = "Calling Agent to generate financial life plan..."
-
-            response = self.model.generate_content(prompt)
+            job_status.add_step(job_id, "Calling Agent to generate financial life plan...")
+            response = await self.call_model_async(prompt, on_chunk=on_chunk)
             if hasattr(response, "usage_metadata"): 
                 usage = response.usage_metadata
                 input_tokens = usage.prompt_token_count
                 output_tokens = usage.candidates_token_count
                 token_cost = self.calculate_token_cost(input_tokens, output_tokens)
-                job_status["static-track-id"]["cost"] = token_cost
+                job_status.update(job_id, cost=token_cost)
             
             
             parsed_response = json.loads(response.text.strip())
-            job_status["static-track-id"].setdefault("steps", []).append("Gemini response received. Post-processing results...")
-            job_status["static-track-id"]["step"] = "Gemini response received. Post-processing results..."
-
+            job_status.add_step(job_id, "Gemini response received. Post-processing results...")
             goal = parsed_response.get("lifePlan", {}).get("goal", "").lower()
 
             if "araba" in goal or "car" in goal or "otomobil" in goal:
-                vehicle_data = self.get_vehicle_options(make="Renault", model="Megane")  
-                job_status["static-track-id"].setdefault("steps", []).append("Fetching vehicle suggestions...")
-                job_status["static-track-id"]["step"] = "Fetching vehicle suggestions..."
+                vehicle_data = await asyncio.to_thread(self.get_vehicle_options, make="Renault", model="Megane")  
+                job_status.add_step(job_id, "Fetching vehicle suggestions...")
                 vehicle_section = "Örnek Araçlar:\n" + "\n".join(
                 [f"- {v['year']} {v['make']} {v['model']}: {v['price']} TRY" for v in vehicle_data]
     )
                 parsed_response["lifePlan"]["recommendations"].append(vehicle_section)
 
             elif "ev" in goal or "house" in goal or "konut" in goal:
-                housing_data = self.get_housing_options(location=parsed_profile.get("city", "Istanbul"))
-                job_status["static-track-id"].setdefault("steps", []).append("Fetching housing suggestions...")
-                job_status["static-track-id"]["step"] = "Fetching housing suggestions..."
+                housing_data = await asyncio.to_thread(self.get_housing_options, location=parsed_profile.get("city", "Istanbul"))
+                job_status.add_step(job_id, "Fetching housing suggestions...")
                 housing_section = "Örnek Konutlar:\n" + "\n".join(
                 [f"- {h['address']} – {h['squareFeet']} m² – {h['rentEstimate']} TRY/ay" for h in housing_data]
     )
                 parsed_response["lifePlan"]["recommendations"].append(housing_section)
 
-            job_status["static-track-id"].setdefault("steps", []).append("Construction complete.")
-            job_status["static-track-id"]["step"] = "Construction complete."
-
+            job_status.add_step(job_id, "Construction complete.")
             return parsed_response
 
 
         except Exception as e:
             print(f"Error in get_life_plan: {e}")
-            job_status["static-track-id"].setdefault("steps", []).append("Error occurred during life plan generation.")
-            job_status["static-track-id"]["step"] = "Error occurred during life plan generation."
+            job_status.add_step(job_id, "Error occurred during life plan generation.")
             return json.dumps({"error": "Hayat planı oluşturulamadı."})
\ No newline at end of file
@@ -0,0 +1,133 @@
+import threading
+
+# Gecikme histogramı kovaları (saniye)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    le = 'le="' + _format_number(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [le])} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_format_number(series['sum'])}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series['count']}")
+        return lines
+
+
+class LLMMetrics:
+    """
+    In-process counters and histograms for every model call, labelled by
+    agent (class name), model and outcome, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.calls = Counter("llm_calls_total", "Model calls by outcome.", ("agent", "model", "outcome"))
+        self.latency = Histogram("llm_call_duration_seconds", "Model call latency including queueing and retries.",
+                                 ("agent", "model"))
+        self.prompt_tokens = Counter("llm_prompt_tokens_total", "Prompt tokens sent.", ("agent", "model"))
+        self.output_tokens = Counter("llm_output_tokens_total", "Output tokens received.", ("agent", "model"))
+        self.tokens_per_call = Histogram("llm_tokens_per_call", "Total tokens per successful call.",
+                                         ("agent", "model"), buckets=TOKEN_BUCKETS)
+        self.cost = Counter("llm_cost_usd_total", "Estimated spend in USD.", ("agent", "model"))
+
+    def record(self, agent, model, outcome, latency, input_tokens=0, output_tokens=0, cost_usd=0.0):
+        self.calls.inc(agent, model, outcome)
+        self.latency.observe(agent, model, value=latency)
+        if outcome == "success":
+            self.prompt_tokens.inc(agent, model, amount=input_tokens)
+            self.output_tokens.inc(agent, model, amount=output_tokens)
+            self.tokens_per_call.observe(agent, model, value=input_tokens + output_tokens)
+            self.cost.inc(agent, model, amount=cost_usd)
+
+    def render(self, scheduler_stats=None):
+        lines = []
+        for metric in (self.calls, self.latency, self.prompt_tokens, self.output_tokens, self.tokens_per_call, self.cost):
+            lines.extend(metric.render())
+
+        if scheduler_stats is not None:
+            lines += ["# HELP llm_scheduler_queue_depth Calls waiting for a scheduler slot.",
+                      "# TYPE llm_scheduler_queue_depth gauge"]
+            for priority in ("interactive", "batch"):
+                depth = scheduler_stats["queued_by_priority"].get(priority, 0)
+                lines.append(f'llm_scheduler_queue_depth{{priority="{priority}"}} {depth}')
+            lines += ["# HELP llm_scheduler_in_flight Calls currently holding a scheduler slot.",
+                      "# TYPE llm_scheduler_in_flight gauge",
+                      f"llm_scheduler_in_flight {scheduler_stats['in_flight']}",
+                      "# HELP llm_scheduler_retries_total Retried model calls (429/5xx).",
+                      "# TYPE llm_scheduler_retries_total counter",
+                      f"llm_scheduler_retries_total {scheduler_stats['retries']}",
+                      "# HELP llm_scheduler_rate_limited_total Model calls rejected with 429.",
+                      "# TYPE llm_scheduler_rate_limited_total counter",
+                      f"llm_scheduler_rate_limited_total {scheduler_stats['rate_limited']}",
+                      "# HELP llm_scheduler_wait_seconds_total Time spent queued before admission.",
+                      "# TYPE llm_scheduler_wait_seconds_total counter"]
+            for priority, seconds in sorted(scheduler_stats["wait_seconds_total"].items()):
+                lines.append(f'llm_scheduler_wait_seconds_total{{priority="{priority}"}} {_format_number(seconds)}')
+
+        return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+llm_metrics = LLMMetrics()
@@ -0,0 +1,334 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+
+# Gemini kotalarına göre süreç genelinde sınırlar (0 = sınırsız)
+LLM_MAX_RPM = int(os.getenv("LLM_MAX_RPM", "2000"))
+LLM_MAX_TPM = int(os.getenv("LLM_MAX_TPM", "4000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+# İstek öncesi token tahmini için beklenen çıktı uzunluğu; yanıt gelince gerçek kullanımla düzeltilir
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1000"))
+
+# Küçük değer önce çalışır: etkileşimli sohbet, toplu PDF parçalarının önüne geçer
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+_RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+_RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "BadGateway", "GatewayTimeout",
+}
+
+
+def estimate_prompt_tokens(prompt):
+    # Kaba tahmin: ~4 karakter / token
+    return len(prompt if isinstance(prompt, str) else str(prompt)) // 4 + 1
+
+
+def is_retryable_error(error):
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in _RETRYABLE_STATUS_CODES:
+        return True
+    if type(error).__name__ in _RETRYABLE_ERROR_NAMES:
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "429" in message or "503" in message
+
+
+def backoff_delay(attempt, base=LLM_BACKOFF_BASE_SECONDS, cap=LLM_BACKOFF_MAX_SECONDS):
+    # Full jitter: aynı anda 429 alan çağrılar aynı anda yeniden denemesin
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage else None
+
+
+def _chunk_text(chunk):
+    # Son (yalnızca finish_reason içeren) parçada .text ValueError fırlatır
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to a burst of `per_minute`. A limit of 0 disables it."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # Tek bir istek kovadan büyükse dolu kovayla geçmesine izin ver
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def consume(self, amount):
+        # Negatif değer iade demektir; bakiye ekside kalabilir (borç sonraki isteklere yansır)
+        if self.capacity > 0:
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "event", "loop", "future", "granted", "cancelled", "enqueued_at")
+
+    def __init__(self, priority, tokens, loop=None, future=None):
+        self.priority = priority
+        self.tokens = tokens
+        self.event = threading.Event() if future is None else None
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.cancelled = False
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Process-wide gate in front of every Gemini call.
+
+    Calls wait in a priority queue until a concurrency slot is free and the
+    request / token buckets allow them; 429 and 5xx errors are retried with
+    jittered exponential backoff (the slot is released while backing off).
+    Works for both worker threads (generate) and the event loop (generate_async).
+    """
+
+    def __init__(self, max_rpm=LLM_MAX_RPM, max_tpm=LLM_MAX_TPM, max_concurrency=LLM_MAX_CONCURRENCY,
+                 max_retries=LLM_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._requests = TokenBucket(max_rpm)
+        self._tokens = TokenBucket(max_tpm)
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._timer = None
+        self._stats = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "max_queue_depth": 0,
+            "wait_seconds_total": {name: 0.0 for name in PRIORITY_NAMES.values()},
+            "admitted": {name: 0 for name in PRIORITY_NAMES.values()},
+        }
+
+    # ---- kuyruk ----
+
+    def _enqueue(self, waiter):
+        with self._lock:
+            heapq.heappush(self._queue, (waiter.priority, next(self._seq), waiter))
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+            self._dispatch()
+
+    def _dispatch(self):
+        # _lock tutulurken çağrılır: kuyruğun başındaki çağrıları sırayla kabul eder
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self.max_concurrency > 0 and self._in_flight >= self.max_concurrency:
+                return
+            now = time.monotonic()
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(waiter.tokens, now))
+            if wait > 0:
+                self._schedule_dispatch(wait)
+                return
+
+            heapq.heappop(self._queue)
+            self._requests.consume(1)
+            self._tokens.consume(waiter.tokens)
+            self._in_flight += 1
+            waiter.granted = True
+            name = PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))
+            self._stats["admitted"][name] = self._stats["admitted"].get(name, 0) + 1
+            self._stats["wait_seconds_total"][name] = self._stats["wait_seconds_total"].get(name, 0.0) + now - waiter.enqueued_at
+            if waiter.future is not None:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+            else:
+                waiter.event.set()
+
+    def _schedule_dispatch(self, delay):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _release(self, estimated_tokens, actual_tokens=None):
+        with self._lock:
+            self._in_flight -= 1
+            if actual_tokens is not None:
+                self._tokens.consume(actual_tokens - estimated_tokens)
+            self._dispatch()
+
+    def acquire(self, priority, tokens):
+        waiter = _Waiter(priority, tokens)
+        self._enqueue(waiter)
+        waiter.event.wait()
+
+    async def acquire_async(self, priority, tokens):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, tokens, loop=loop, future=loop.create_future())
+        self._enqueue(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    # İptal, kabulden hemen sonra geldiyse slotu geri ver
+                    self._in_flight -= 1
+                    self._dispatch()
+                else:
+                    waiter.cancelled = True
+            raise
+
+    # ---- çağrılar ----
+
+    def _estimate(self, prompt):
+        return estimate_prompt_tokens(prompt) + LLM_EXPECTED_OUTPUT_TOKENS
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _should_retry(self, error, attempt, streamed):
+        # Akışta parça iletildiyse tekrar denemek kullanıcıya yinelenen metin gönderir
+        if streamed or attempt >= self.max_retries or not is_retryable_error(error):
+            return False
+        self._count("retries")
+        if getattr(error, "code", None) == 429 or "429" in str(error) or type(error).__name__ == "ResourceExhausted":
+            self._count("rate_limited")
+        return True
+
+    def generate(self, model, prompt, priority=PRIORITY_INTERACTIVE, on_chunk=None):
+        """Blocking model.generate_content through the scheduler (streams to on_chunk if given)."""
+        estimated = self._estimate(prompt)
+        self._count("calls")
+        attempt = 0
+        while True:
+            self.acquire(priority, estimated)
+            streamed = False
+            actual = None
+            try:
+                if on_chunk is None:
+                    response = model.generate_content(prompt)
+                else:
+                    response = model.generate_content(prompt, stream=True)
+                    for chunk in response:
+                        text = _chunk_text(chunk)
+                        if text:
+                            streamed = True
+                            on_chunk(text)
+                actual = _usage_tokens(response)
+            except Exception as e:
+                self._release(estimated)
+                if not self._should_retry(e, attempt, streamed):
+                    self._count("failed")
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"⏳ LLM call failed ({e}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._release(estimated, actual)
+            self._count("succeeded")
+            return response
+
+    async def generate_async(self, model, prompt, priority=PRIORITY_INTERACTIVE, on_chunk=None):
+        """Async model.generate_content_async through the scheduler (streams to on_chunk if given)."""
+        estimated = self._estimate(prompt)
+        self._count("calls")
+        attempt = 0
+        while True:
+            await self.acquire_async(priority, estimated)
+            streamed = False
+            actual = None
+            try:
+                if on_chunk is None:
+                    response = await model.generate_content_async(prompt)
+                else:
+                    response = await model.generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        text = _chunk_text(chunk)
+                        if text:
+                            streamed = True
+                            on_chunk(text)
+                actual = _usage_tokens(response)
+            except asyncio.CancelledError:
+                self._release(estimated)
+                raise
+            except Exception as e:
+                self._release(estimated)
+                if not self._should_retry(e, attempt, streamed):
+                    self._count("failed")
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"⏳ LLM call failed ({e}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._release(estimated, actual)
+            self._count("succeeded")
+            return response
+
+    def stats(self):
+        with self._lock:
+            queued = {}
+            for priority, _, waiter in self._queue:
+                if not waiter.cancelled:
+                    name = PRIORITY_NAMES.get(priority, str(priority))
+                    queued[name] = queued.get(name, 0) + 1
+            now = time.monotonic()
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            return {
+                **{k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()},
+                "queue_depth": sum(queued.values()),
+                "queued_by_priority": queued,
+                "in_flight": self._in_flight,
+                "limits": {
+                    "max_rpm": int(self._requests.capacity),
+                    "max_tpm": int(self._tokens.capacity),
+                    "max_concurrency": self.max_concurrency,
+                    "max_retries": self.max_retries,
+                },
+                "available_requests": round(self._requests.tokens, 1) if self._requests.capacity > 0 else None,
+                "available_tokens": round(self._tokens.tokens) if self._tokens.capacity > 0 else None,
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# Tüm ajanların paylaştığı tek zamanlayıcı
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,26 @@
+# /market-prices için Flask ve ASGI uygulamalarının ortak fiyat çekme fonksiyonu (yfinance ilk istekte yüklenir)
+
+def get_current_market_prices_fast(file_path: str):
+    import yfinance as yf
+
+    with open(file_path, "r") as f:
+        symbols = [line.strip() for line in f if line.strip()]
+
+    data = yf.download(
+        tickers=" ".join(symbols),
+        period="1d",
+        interval="1m",  
+        group_by="ticker",
+        threads=True,
+        progress=False
+    )
+
+    results = []
+    for symbol in symbols:
+        try:
+            last_price = data[symbol]["Close"].dropna().iloc[-1]
+            results.append(f"{symbol}: {last_price:.2f} $")
+        except Exception:
+            results.append(f"{symbol}: Price not available")
+
+    return results
@@ -0,0 +1,164 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from agents.baseAgent import cache_path
+
+MERCHANT_CACHE_DB_PATH = os.getenv("MERCHANT_CACHE_DB_PATH") or cache_path("merchant_categories.sqlite3")
+# Anahtarı oluşturan en fazla kelime sayısı (şube / şehir ekleri aynı işletmeyi bölmesin)
+MERCHANT_KEY_MAX_WORDS = int(os.getenv("MERCHANT_KEY_MAX_WORDS", "3"))
+
+_ASCII_FOLD = str.maketrans("ıİşŞğĞüÜöÖçÇ", "iissgguuoocc")
+# "SATIŞ-517040*7261-", "İade -517040*7261-", "7261- 40.00TL -" gibi kart / tutar ekleri ve kazanılan puan bilgisi
+_NOISE_RE = re.compile(
+    r"(?:satis|iade)\s*-?\s*\d*\*?\d*-?|\d+[.,]?\d*\s*tl|kazanilan\s*\S*puan\s*:?\s*[\d.,]+|\d+",
+)
+# Ödeme aracısı önekleri: "IYZICO /S/TEMU" -> "temu", "SIPAY/PETROL OFIS" -> "petrol ofis"
+_FACILITATOR_RE = re.compile(r"^(?:(?:iyzico|sipay|paycell|moneypay|yemekpay|paybul|papara|param|s)\s*[/*]\s*)+")
+# İşletme adından sonra gelen şube / adres kısmı ("MİGROS-AKSARAY CAD", "BOYNER - MIGROS", "BİM Q086 ŞEHİT ...")
+_SEGMENT_RE = re.compile(r"\s*[-/*]\s*")
+_STORE_CODE_RE = re.compile(r"\s[a-z]\d{3,}\b")
+# Kişiden kişiye transferler: açıklama karşı tarafın adını taşır, ortak önbelleğe girmez
+_TRANSFER_RE = re.compile(r"^\W*(?:(?:cep|internet|mobil)\W*)?(?:fast|eft|ef\d|havale|virman|sube|para transferi)")
+_NON_WORD_RE = re.compile(r"[^a-z]+")
+# Bu kelimelerden biriyle adres, şehir ya da şirket türü başlar; sonrası anahtara girmez
+_BRANCH_WORDS = frozenset("cad cd caddesi sok sk sokak mah mh mahallesi bulv blv bulvari avm sube subesi magaza".split())
+_LEGAL_WORDS = frozenset("ltd sti as san tic ins ve ith ihr koll sirketi".split())
+_CITY_WORDS = frozenset(
+    "adana adiyaman afyon afyonkarahisar agri aksaray amasya ankara antalya ardahan artvin aydin balikesir bartin "
+    "batman bayburt bilecik bingol bitlis bolu burdur bursa canakkale cankiri corum denizli diyarbakir duzce edirne "
+    "elazig erzincan erzurum eskisehir gaziantep giresun gumushane hakkari hatay igdir isparta istanbul izmir "
+    "kahramanmaras karabuk karaman kars kastamonu kayseri kilis kirikkale kirklareli kirsehir kocaeli konya kutahya "
+    "malatya manisa mardin mersin mugla mus nevsehir nigde ordu osmaniye rize sakarya samsun sanliurfa siirt sinop "
+    "sirnak sivas tekirdag tokat trabzon tunceli usak van yalova yozgat zonguldak".split()
+)
+
+
+def ascii_fold(text):
+    """Maps Turkish letters to lowercase ASCII ("Ş" / "ş" -> "s"); callers normalize case."""
+    return (text or "").translate(_ASCII_FOLD)
+
+
+def merchant_key(description):
+    """
+    Normalized merchant name: ASCII-folded, lowercased, card numbers / amounts /
+    digits and payment-facilitator prefixes removed, cut at the branch, city or
+    company-type part, truncated trailing fragments dropped.
+    e.g. "SATIŞ-517040*7261-MİGROS-AKSARAY CAD KEÇİÖ" -> "migros",
+    "SATIŞ-517040*7261-BİM Q086 ŞEHİT HAKAN TUR" -> "bim",
+    "SATIŞ-517040*7261-OTOMATCI ANKARA OTOMAT G" -> "otomatci",
+    "SATIŞ-517040*7261-KRISTAL UNLU GIDA LTD ST" -> "kristal unlu gida".
+    Person-to-person transfers return None.
+    """
+    text = ascii_fold(description).lower()
+    if _TRANSFER_RE.match(text):
+        return None
+    text = _NOISE_RE.sub(" ", _STORE_CODE_RE.sub(" - ", text)).strip(" -/*.")
+    text = _FACILITATOR_RE.sub("", text)
+    name = _SEGMENT_RE.split(text, 1)[0]
+
+    words = []
+    for w in _NON_WORD_RE.split(name):
+        if w in _BRANCH_WORDS or w in _LEGAL_WORDS or w in _CITY_WORDS:
+            break
+        if len(w) > 1:
+            words.append(w)
+    words = words[:MERCHANT_KEY_MAX_WORDS]
+    # Banka alanı ~22 karakterde keser: sondaki 1-2 harflik parça ("... GA", "... ST") anahtara girmez
+    while len(words) > 1 and len(words[-1]) <= 2:
+        words.pop()
+    return " ".join(words) or None
+
+
+class MerchantCategoryCache:
+    """
+    Persistent merchant-key -> spending_category cache shared by all users,
+    backed by SQLite, with hit / miss counters. Only the normalized merchant
+    name is stored, never the user's raw description.
+    """
+
+    def __init__(self, db_path=MERCHANT_CACHE_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS merchant_categories (
+                merchant_key TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                seen INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        # Eski sürümün satırları ham açıklamayı (example) ve şube / kişi adı içeren anahtarları taşır; silinir
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(merchant_categories)")}
+        if "example" in columns:
+            self._conn.execute("DELETE FROM merchant_categories WHERE example IS NOT NULL")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, descriptions):
+        """Returns {description: category} for the descriptions whose merchant is known."""
+        keys = {d: merchant_key(d) for d in descriptions}
+        wanted = sorted({k for k in keys.values() if k})
+        found = {}
+        with self._lock:
+            # SQLite parametre sınırına takılmamak için parça parça sorgula
+            for i in range(0, len(wanted), 500):
+                batch = wanted[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT merchant_key, category FROM merchant_categories WHERE merchant_key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            result = {d: found[k] for d, k in keys.items() if k in found}
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+        return result
+
+    def store(self, categories):
+        """Records confirmed {description: category} results."""
+        now = time.time()
+        rows = []
+        for description, category in categories.items():
+            key = merchant_key(description)
+            if key and category:
+                rows.append((key, category, now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO merchant_categories (merchant_key, category, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(merchant_key) DO UPDATE SET category = excluded.category, seen = seen + 1, "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM merchant_categories").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "merchants": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+_merchant_cache = None
+_merchant_cache_lock = threading.Lock()
+
+
+def get_merchant_cache():
+    # SQLite dosyası ilk kullanımda açılır
+    global _merchant_cache
+    if _merchant_cache is None:
+        with _merchant_cache_lock:
+            if _merchant_cache is None:
+                _merchant_cache = MerchantCategoryCache()
+    return _merchant_cache
@@ -0,0 +1,165 @@
+import re
+from decimal import Decimal
+
+# Tutarlar tek bir düzenli ifadeyle kuruş / cent cinsinden tamsayıya çevrilir; toplama
+# tamsayılarla yapılır, metne yalnızca çıktı aşamasında dönülür.
+#
+# Desteklenen biçimler: "1.234,56 TL", "-195,00 TL", "+1.200,00 TL", "₺1.234,5", "1234,56",
+# "1,234.56 USD", "$1,234.56", "40.00TL", "(250,00)", "195,00-", 1234.5 (int / float / Decimal).
+# Örnekler doctest olarak çalışır (financeCopilot/agents içinden): python -m doctest agents/money.py
+
+_CURRENCY_RE = re.compile(r"(?i)tl|try|usd|[₺$]|\s+")
+_AMOUNT_RE = re.compile(
+    r"(?P<open>\()?(?P<sign>[-+−])?"
+    r"(?P<int>\d{1,3}(?:[.,]\d{3})+|\d+)"
+    r"(?:(?P<dec>[.,])(?P<frac>\d{1,2}))?"
+    r"(?P<trail>-)?(?P<close>\))?"
+)
+# En yaygın biçim için hızlı yol: "1.234,56 TL" / "-195,00 TL"
+_CANONICAL_TL_RE = re.compile(r"([-+]?)(([1-9]\d{0,2}(?:\.\d{3})*|0),(\d{2}) TL)")
+
+
+def parse_minor(value):
+    """
+    Returns the amount in minor units (kuruş / cents) as an int, or None if it is not an amount.
+
+    >>> [parse_minor(v) for v in ("1.234,56 TL", "-195,00 TL", "+1.200,00 TL", "0,02 TL", "1.234.567,89 TL")]
+    [123456, -19500, 120000, 2, 123456789]
+    >>> [parse_minor(v) for v in ("₺1.234,5", "1234,56", "12,5", "1.234", "40.00TL")]
+    [123450, 123456, 1250, 123400, 4000]
+    >>> [parse_minor(v) for v in ("1,234.56 USD", "$1,234.56", "(250,00)", "195,00-", "− 6,39 TL")]
+    [123456, 123456, -25000, -19500, -639]
+    >>> [parse_minor(v) for v in (1234.5, 3200, Decimal("10.10"))]
+    [123450, 320000, 1010]
+    >>> [parse_minor(v) for v in ("", "abc", "1,234,56", None, True)]
+    [None, None, None, None, None]
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, (float, Decimal)):
+        return int((Decimal(str(value)) * 100).quantize(Decimal(1)))
+    if not isinstance(value, str):
+        return None
+
+    match = _AMOUNT_RE.fullmatch(_CURRENCY_RE.sub("", value))
+    if not match or bool(match.group("open")) != bool(match.group("close")):
+        return None
+
+    integer = match.group("int")
+    dec, frac = match.group("dec"), match.group("frac")
+    # "1.234" / "1,234": tek ayırıcılı 3 haneli grup binlik ayırıcıdır; ondalık kısmı en fazla 2 hanedir
+    if dec and len(integer) > 3 and integer[-4] == dec:
+        return None
+    minor = int(integer.replace(".", "").replace(",", "")) * 100 + (int(frac.ljust(2, "0")) if frac else 0)
+
+    negative = match.group("sign") in ("-", "−") or bool(match.group("trail")) or bool(match.group("open"))
+    return -minor if negative else minor
+
+
+def parse_amount(value):
+    """
+    Decimal variant of parse_minor.
+
+    >>> parse_amount("1.234,56 TL"), parse_amount("-0,05 TL"), parse_amount("abc")
+    (Decimal('1234.56'), Decimal('-0.05'), None)
+    """
+    minor = parse_minor(value)
+    return None if minor is None else Decimal(minor).scaleb(-2)
+
+
+def parse_minor_many(values):
+    """
+    Vectorized path for lists of amounts: canonical "1.234,56 TL" strings go
+    through a single anchored regex and integer math, everything else falls
+    back to parse_minor.
+
+    >>> parse_minor_many(["1.234,56 TL", "-195,00 TL", "0,02 TL", "$1,234.56", "(250,00)", "1,234,56", None])
+    [123456, -19500, 2, 123456, -25000, None, None]
+    """
+    canonical = _CANONICAL_TL_RE.fullmatch
+    result = []
+    append = result.append
+    for value in values:
+        match = canonical(value) if isinstance(value, str) else None
+        if match:
+            sign, _, integer, frac = match.groups()
+            minor = int(integer.replace(".", "")) * 100 + int(frac)
+            append(-minor if sign == "-" else minor)
+        else:
+            append(parse_minor(value))
+    return result
+
+
+def normalize_many(values):
+    """
+    Returns [(abs_minor, "1.234,56 TL")] (or (None, None) for non-amounts).
+    Canonical inputs reuse their own text, so only unusual formats are re-formatted.
+
+    >>> normalize_many(["-195,00 TL", "40.00TL", "(250,00)", "abc"])
+    [(19500, '195,00 TL'), (4000, '40,00 TL'), (25000, '250,00 TL'), (None, None)]
+    """
+    canonical = _CANONICAL_TL_RE.fullmatch
+    result = []
+    append = result.append
+    for value in values:
+        match = canonical(value) if isinstance(value, str) else None
+        if match:
+            _, text, integer, frac = match.groups()
+            append((int(integer.replace(".", "")) * 100 + int(frac), text))
+            continue
+        minor = parse_minor(value)
+        if minor is None:
+            append((None, None))
+        else:
+            minor = abs(minor)
+            append((minor, format_minor(minor)))
+    return result
+
+
+def minor_to_float(minor):
+    return minor / 100
+
+
+def format_minor(minor, currency="TL"):
+    """
+    Formats minor units in Turkish notation.
+
+    >>> [format_minor(m) for m in (123456, 5, -19500, 100000000)]
+    ['1.234,56 TL', '0,05 TL', '-195,00 TL', '1.000.000,00 TL']
+    """
+    sign = "-" if minor < 0 else ""
+    whole, frac = divmod(abs(minor), 100)
+    return f"{sign}{whole:,}".replace(",", ".") + f",{frac:02d} {currency}"
+
+
+def format_amount(value, currency="TL"):
+    minor = parse_minor(value)
+    return None if minor is None else format_minor(minor, currency)
+
+
+def totals_by(items, key, amount="amount", include=None):
+    """
+    Sums amounts per key in minor units. items are dicts; include(item) filters
+    them. Unparseable amounts are skipped and counted. Returns (totals, skipped).
+
+    >>> totals_by([{"c": "a", "amount": "1,00 TL"}, {"c": "a", "amount": "2,50 TL"}, {"c": "b", "amount": "?"}], "c")
+    ({'a': 350}, 1)
+
+    Sums are exact in kuruş, where float addition drifts (0.1 + 0.2 != 0.3):
+
+    >>> totals, _ = totals_by([{"c": "a", "amount": "0,10 TL"}, {"c": "a", "amount": "0,20 TL"}] * 5, "c")
+    >>> format_minor(totals["a"])
+    '1,50 TL'
+    """
+    selected = [item for item in items if include is None or include(item)]
+    totals = {}
+    skipped = 0
+    for item, minor in zip(selected, parse_minor_many(item.get(amount) for item in selected)):
+        if minor is None:
+            skipped += 1
+            continue
+        k = item.get(key)
+        totals[k] = totals.get(k, 0) + minor
+    return totals, skipped
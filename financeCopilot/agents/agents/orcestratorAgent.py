@@ -1,8 +1,11 @@
 
+import re
 import json
-import google.generativeai as genai
+import time
+import threading
 
 from agents.baseAgent import Agent
+from agents.conversation_memory import ConversationStore
 
 from agents.lifePlannerAgent import LifePlannerAgent, lifePlannerAgentRole
 from agents.expenseAnalyzerAgent import ExpenseAnalyzerAgent, expenseAnalyzerRole
@@ -65,25 +68,156 @@ agents = {
 }
 
 
+# Yerel niyet yönlendirici: net mesajlarda yönlendirme için Gemini çağrısını atlar.
+# Desenler ASCII'ye indirgenmiş (Türkçe karakterler sadeleştirilmiş) küçük harfli metinle eşleşir.
+INTENT_RULES = {
+    "investmentadvisoragent": [
+        (r"\byatirim", 2.0),
+        (r"\bhisse", 2.0),
+        (r"\bborsa", 2.0),
+        (r"\bportfoy", 2.0),
+        (r"\binvest", 2.0),
+        (r"\bstocks?\b", 2.0),
+        (r"\bportfolio", 2.0),
+        (r"\b(etf|dividend|temettu|fon|fund)s?\b", 1.5),
+    ],
+    "lifeplanneragent": [
+        (r"hayat plan", 3.0),
+        (r"life plan", 3.0),
+        (r"\b(ev|araba|otomobil|konut|daire|house|car|home)\b.*\b(al|almak|alabilir|buy|afford)", 2.5),
+        (r"\b(almak|buy|afford)\b.*\b(ev|araba|otomobil|konut|house|car|home)\b", 2.5),
+        (r"\b(evlen|dugun|cocuk|bebek|emeklilik|marry|wedding|child|baby|retire)", 2.0),
+        (r"\b(birikim|biriktir|save up|saving for)", 1.5),
+        (r"\bplan(la|i|lama)?\b", 1.0),
+    ],
+    "expenseanalyzeragent": [
+        (r"\b(ekstre|hesap dokumu|hesap hareket)", 3.0),
+        (r"\b(statement|bank statement)", 3.0),
+        (r"\b(harcamalarimi|harcama analiz|analyze my (spending|expenses))", 2.5),
+    ],
+    "normalchatagent": [
+        (r"^\s*(merhaba|selam|hello|hi|hey|gunaydin|iyi aksamlar)\b", 2.5),
+        (r"\b(tesekkur|sagol|thanks|thank you)", 2.5),
+        (r"\b(nasilsin|how are you)\b", 2.5),
+        (r"\b(nedir|ne demek|what is|what does|explain|acikla)\b", 1.0),
+    ],
+}
+
+# Her ajanın yapısal çıktısında bulunması gereken alan grupları (gruplardan biri yeterli)
+AGENT_RESPONSE_ENVELOPES = {
+    "expenseanalyzeragent": [("transactions", "category_totals")],
+    "lifeplanneragent": [("askingQuestion", "lifePlan"), ("askingQuestion", "question")],
+    "investmentadvisoragent": [("recommendations",)],
+    "normalchatagent": [("response",)],
+}
+
+_ASCII_FOLD = str.maketrans("ıİşŞğĞüÜöÖçÇ", "iissgguuoocc")
+
+
+class IntentRouter:
+    """
+    Keyword/regex intent classifier used before the routing LLM call.
+    Only answers when the top agent clearly wins; otherwise returns None
+    so the caller falls back to the model.
+    """
+
+    def __init__(self, rules=INTENT_RULES, min_score=2.0, min_confidence=0.75):
+        self.rules = {
+            key: [(re.compile(pattern), weight) for pattern, weight in patterns]
+            for key, patterns in rules.items()
+        }
+        self.min_score = min_score
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.total = 0
+        self.hits = 0
+        self.llm_calls = 0
+        self.llm_latency_total = 0.0
+
+    @staticmethod
+    def normalize(text):
+        return (text or "").translate(_ASCII_FOLD).lower()
+
+    def classify(self, user_text, has_file=False):
+        # Dosya yalnızca expenseAnalyzerAgent tarafından işlenebilir
+        if has_file:
+            return "expenseanalyzeragent", 1.0
+
+        text = self.normalize(user_text)
+        scores = {
+            key: sum(weight for pattern, weight in patterns if pattern.search(text))
+            for key, patterns in self.rules.items()
+        }
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        (best_key, best), (_, second) = ranked[0], ranked[1]
+        if best < self.min_score:
+            return None, 0.0
+        confidence = best / (best + second)
+        if confidence < self.min_confidence:
+            return None, confidence
+        return best_key, confidence
+
+    def route(self, user_text, has_file=False):
+        agent_key, confidence = self.classify(user_text, has_file)
+        with self._lock:
+            self.total += 1
+            if agent_key:
+                self.hits += 1
+        if agent_key:
+            print(f"⚡ Local router picked {agent_key} (confidence {confidence:.2f})")
+        return agent_key
+
+    def record_llm_call(self, seconds):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_latency_total += seconds
+
+    def stats(self):
+        with self._lock:
+            avg_llm_latency = self.llm_latency_total / self.llm_calls if self.llm_calls else 0.0
+            return {
+                "total_routed": self.total,
+                "local_hits": self.hits,
+                "llm_fallbacks": self.llm_calls,
+                "hit_rate": round(self.hits / self.total, 4) if self.total else 0.0,
+                "avg_llm_routing_latency_s": round(avg_llm_latency, 4),
+                # Her yerel isabet ortalama bir LLM yönlendirme süresi kazandırır
+                "estimated_latency_saved_s": round(self.hits * avg_llm_latency, 3),
+            }
+
+
 class Orcestrator(Agent):
     def __init__(self, name, role):
         super().__init__(name=name, role=role)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
-            },
-            system_instruction=self.role,
-        )
-        self.conversation_history = []
-
-    def build_contextual_prompt(self, user_input):
+        self.memory = ConversationStore()
+        self.intent_router = IntentRouter()
+        self._transport_lock = threading.Lock()
+        self.passthrough_count = 0
+        self.llm_rewrite_count = 0
+
+    async def decide_job(self, user_text, has_file=False, user_key=None):
+        """
+        Returns the routing decision JSON, using the local router when it is
+        confident and the LLM only for ambiguous messages.
+        """
+        agent_key = None if has_file else self.pending_question_agent(user_key)
+        if not agent_key:
+            agent_key = self.intent_router.route(user_text, has_file)
+        if agent_key:
+            return {"job": "routing", "selected_agent": agent_key, "agent_response": None}
+
+        started = time.perf_counter()
+        orchestrator_decision = await self.call_model_async(self.build_contextual_prompt(user_text, user_key))
+        self.intent_router.record_llm_call(time.perf_counter() - started)
+        print(f"🧠 Orchestrator decision: {orchestrator_decision.text}")
+        return json.loads(orchestrator_decision.text)
+
+    def build_contextual_prompt(self, user_input, user_key=None):
+        history = self.memory.recent(user_key) if user_key else []
+        if not history:
+            return user_input
         prompt = "Below is a log of previous conversation steps:\n"
-        for step in self.conversation_history[-5:]:
+        for step in history:
             prompt += f"User: {step['user_input']}\n"
             prompt += f"Agent: {step['agent_key']}\n"
             prompt += f"Response: {step['agent_response']}\n"
@@ -91,24 +225,32 @@ class Orcestrator(Agent):
         prompt += "Which agent should handle this?"
         return prompt
 
-    def get_agent_key(self, user_input):
+    def pending_question_agent(self, user_key):
+        # Son ajan yanıtı bir soruyla bittiyse kullanıcının cevabı aynı ajana gider
+        if not user_key:
+            return None
+        last_turn = self.memory.last_turn(user_key)
+        if not last_turn:
+            return None
+        last_agent = last_turn["agent_key"]
+        last_response = last_turn["agent_response"]
+        # Hafıza yanıt özetini string saklar; ham {"response": "..."} biçimi de soru olarak tanınır
+        if isinstance(last_response, dict):
+            last_response = last_response.get("response")
+        if isinstance(last_response, str) and last_response.strip() and (last_response.strip().endswith("?") or "?" in last_response.split()[-3:]):
+            print(f"↪️ Agent {last_agent} asked a question, routing reply back to it.")
+            return last_agent
+        return None
+
+    def get_agent_key(self, user_input, user_key=None):
         print(f"🔁 Routing request: {user_input}")
 
-        if self.conversation_history:
-            last_turn = self.conversation_history[-1]
-            last_agent = last_turn["agent_key"]
-            last_response = last_turn["agent_response"]
-            if isinstance(last_response, str) and (last_response.strip().endswith("?") or "?" in last_response.split()[-3:]):
-                print(f"↪️ Agent {last_agent} asked a question, routing reply back to it.")
-                return last_agent
-            elif isinstance(last_response, dict) and "response" in last_response:
-                response_text = last_response["response"]
-                if isinstance(response_text, str) and (response_text.strip().endswith("?") or "?" in response_text.split()[-3:]):
-                    print(f"↪️ Agent {last_agent} asked a question, routing reply back to it.")
-                    return last_agent
-
-        contextual_prompt = self.build_contextual_prompt(user_input)
-        response = self.model.generate_content(contextual_prompt)
+        last_agent = self.pending_question_agent(user_key)
+        if last_agent:
+            return last_agent
+
+        contextual_prompt = self.build_contextual_prompt(user_input, user_key)
+        response = self.call_model(contextual_prompt)
         agent_key = response.text.strip().lower()
         print(f"🔑 Gemini suggested agent key: {agent_key}")
 
@@ -119,7 +261,26 @@ class Orcestrator(Agent):
 
         return "normalchatagent"
 
-    def generate_final_response(self, user_input, agent_response):
+    def is_valid_agent_output(self, agent_key, agent_response):
+        if not isinstance(agent_response, dict):
+            return False
+        if "error" in agent_response:
+            return True
+        required = AGENT_RESPONSE_ENVELOPES.get(agent_key)
+        if required is None:
+            return bool(agent_response)
+        return any(all(k in agent_response for k in keys) for keys in required)
+
+    def transport_stats(self):
+        with self._transport_lock:
+            total = self.passthrough_count + self.llm_rewrite_count
+            return {
+                "passthrough": self.passthrough_count,
+                "llm_rewrites": self.llm_rewrite_count,
+                "llm_rewrite_rate": round(self.llm_rewrite_count / total, 4) if total else 0.0,
+            }
+
+    def generate_final_response(self, user_input, agent_response, agent_key=None):
         try:
             # If it's a string containing JSON, try parsing it
             if isinstance(agent_response, str):
@@ -128,10 +289,24 @@ class Orcestrator(Agent):
                 except json.JSONDecodeError:
                     pass  # keep as is if not JSON string
 
+            # Yapısal çıktı beklenen zarfa uyuyorsa LLM'e göndermeden aynen taşı
+            if self.is_valid_agent_output(agent_key, agent_response):
+                with self._transport_lock:
+                    self.passthrough_count += 1
+                return {
+                    "job": "transporting",
+                    "selected_agent": None,
+                    "agent_response": agent_response,
+                }
+
+            with self._transport_lock:
+                self.llm_rewrite_count += 1
+            print(f"✍️ Agent output for {agent_key} needs rewriting, calling orchestrator LLM.")
+
             # Format the agent output nicely
             agent_output = json.dumps(agent_response, indent=2) if isinstance(agent_response, dict) else str(agent_response)
 
-            response = self.model.generate_content(agent_output)
+            response = self.call_model(agent_output)
             print(response.text.strip())
             return response.text.strip()
 
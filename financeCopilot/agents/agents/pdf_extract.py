@@ -0,0 +1,219 @@
+import os
+import shutil
+import tempfile
+import threading
+import importlib.util
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from agents.uploads import BufferedUpload, open_pdf
+
+# Sayfa metni işlem havuzunda çıkarılır; metin katmanı olmayan (taranmış) sayfalar OCR'a gider
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+# Bu sayfa sayısının altındaki PDF'ler havuza gönderilmeden bu süreçte okunur
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "4"))
+# gRPC / iş parçacığı kullanan süreçte fork güvenli değil
+PDF_EXTRACT_START_METHOD = os.getenv("PDF_EXTRACT_START_METHOD", "spawn")
+OCR_ENABLED = os.getenv("OCR_ENABLED", "1") == "1"
+OCR_LANG = os.getenv("OCR_LANG", "tur+eng")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_PAGE_TIMEOUT_SECONDS = float(os.getenv("OCR_PAGE_TIMEOUT_SECONDS", "30"))
+
+
+# --- İşçi süreçte çalışan fonksiyonlar (spawn ile içe aktarılabilir olmalı) ---
+
+def _read_pages(pdf, start, stop):
+    texts = []
+    for page in pdf.pages[start:stop]:
+        texts.append(page.extract_text() or "")
+        page.flush_cache()
+    return texts
+
+
+def _extract_page_range(path, start, stop):
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return _read_pages(pdf, start, stop)
+
+
+def _ocr_page(path, index, dpi=OCR_DPI, lang=OCR_LANG, timeout=OCR_PAGE_TIMEOUT_SECONDS):
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    with fitz.open(path) as doc:
+        pixmap = doc[index].get_pixmap(dpi=dpi)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    # timeout aşılırsa pytesseract tesseract sürecini sonlandırıp RuntimeError fırlatır
+    return pytesseract.image_to_string(image, lang=lang, timeout=timeout)
+
+
+# --- Ana süreç ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extract_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, PDF_EXTRACT_WORKERS),
+                    mp_context=multiprocessing.get_context(PDF_EXTRACT_START_METHOD),
+                )
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def ocr_available():
+    return (
+        OCR_ENABLED
+        and importlib.util.find_spec("pytesseract") is not None
+        and importlib.util.find_spec("fitz") is not None
+        and shutil.which("tesseract") is not None
+    )
+
+
+@contextmanager
+def local_pdf_path(source):
+    """
+    Yields a filesystem path worker processes can open. Paths, and uploads
+    already spilled to a named file, are used as-is; other uploads are copied
+    to a uniquely named temp file that is removed afterwards.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    if isinstance(source, BufferedUpload) and source.path:
+        yield source.path
+        return
+    stream = source.open() if isinstance(source, BufferedUpload) else source
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(stream, tmp)
+    try:
+        yield tmp.name
+    finally:
+        os.unlink(tmp.name)
+
+
+def _wait_ocr(future, page_number):
+    try:
+        # Görev işçide kendi süresiyle sınırlı; buradaki pay render ve kuyruk gecikmesi için
+        return future.result(timeout=OCR_PAGE_TIMEOUT_SECONDS * 2) or ""
+    except FutureTimeoutError:
+        future.cancel()
+        print(f"⏱️ Sayfa {page_number}: OCR zaman aşımı")
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        print(f"⚠️ Sayfa {page_number}: OCR hatası: {e}")
+    return ""
+
+
+def iter_page_texts(source):
+    """
+    Yields (page_number, text, used_ocr) in page order. Short PDFs are read
+    in-process straight from the upload buffer; longer ones are read in page
+    ranges across the process pool, and empty pages are OCR'd there in
+    parallel as soon as their range is done, each bounded by
+    OCR_PAGE_TIMEOUT_SECONDS. Falls back to in-process extraction if the
+    pool breaks.
+    """
+    use_ocr = ocr_available()
+    # Sayfa sayısı ve kısa PDF'lerin metni tampondan okunur; diske yazılmaz
+    with open_pdf(source) as pdf:
+        page_count = len(pdf.pages)
+        texts = _read_pages(pdf, 0, page_count) if page_count < PDF_PARALLEL_MIN_PAGES else None
+    if page_count == 0:
+        return
+    if texts is not None and not (use_ocr and any(not text.strip() for text in texts)):
+        for index, text in enumerate(texts):
+            yield index + 1, text, False
+        return
+
+    # İşçi süreçler dosya yolu ister: geçici dosya yalnızca havuza iş gönderilirken yazılır
+    with local_pdf_path(source) as path:
+        done = 0
+        try:
+            for page in _iter_parallel(path, page_count, use_ocr, texts):
+                done += 1
+                yield page
+        except BrokenProcessPool:
+            print("⚠️ PDF işçi havuzu çöktü, kalan sayfalar bu süreçte okunuyor.")
+            _reset_pool()
+            yield from _iter_serial(path, done, page_count, use_ocr)
+
+
+def _iter_parallel(path, page_count, use_ocr, known_texts=None):
+    pool = get_extract_pool()
+    range_futures = {}
+    range_texts = {}
+    ocr_futures = {}
+
+    def collect(start, texts):
+        # Boş sayfalar, sıradaki sayfalar beklenirken OCR'a gönderilir
+        range_texts[start] = texts
+        if use_ocr:
+            for offset, text in enumerate(texts):
+                if not text.strip():
+                    ocr_futures[start + offset] = pool.submit(_ocr_page, path, start + offset)
+
+    def collect_ready():
+        # Future sonucu aldıktan sonra bırakılır; metin yalnızca yield edilene kadar range_texts'te kalır
+        for start, future in list(range_futures.items()):
+            if future.done():
+                collect(start, range_futures.pop(start).result())
+
+    if known_texts is not None:
+        # Metni zaten okunmuş kısa PDF: havuza yalnızca boş sayfaların OCR'ı gider
+        starts = [0]
+        collect(0, known_texts)
+    else:
+        size = -(-page_count // max(1, PDF_EXTRACT_WORKERS))
+        starts = list(range(0, page_count, size))
+        for start in starts:
+            range_futures[start] = pool.submit(_extract_page_range, path, start, min(start + size, page_count))
+
+    try:
+        for start in starts:
+            collect_ready()
+            if start not in range_texts:
+                collect(start, range_futures.pop(start).result())
+                collect_ready()
+            # Yield edilen aralık bellekten düşer; bellekte en fazla henüz sırası gelmemiş aralıklar kalır
+            for offset, text in enumerate(range_texts.pop(start)):
+                index = start + offset
+                if index in ocr_futures:
+                    yield index + 1, _wait_ocr(ocr_futures.pop(index), index + 1), True
+                else:
+                    yield index + 1, text, False
+    finally:
+        for future in range_futures.values():
+            future.cancel()
+        for future in ocr_futures.values():
+            future.cancel()
+
+
+def _iter_serial(path, start, page_count, use_ocr):
+    for index, text in enumerate(_extract_page_range(path, start, page_count), start=start):
+        if text.strip() or not use_ocr:
+            yield index + 1, text, False
+            continue
+        try:
+            yield index + 1, _ocr_page(path, index) or "", True
+        except Exception as e:
+            print(f"⚠️ Sayfa {index + 1}: OCR hatası: {e}")
+            yield index + 1, "", True
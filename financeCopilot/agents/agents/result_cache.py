@@ -0,0 +1,92 @@
+import os
+import json
+import threading
+
+from agents.baseAgent import cache_path
+
+STATEMENT_CACHE_DIR = os.getenv("STATEMENT_CACHE_DIR") or cache_path("statement_results_v1")
+STATEMENT_CACHE_MAX_BYTES = int(os.getenv("STATEMENT_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+class StatementResultCache:
+    """
+    Size-bounded disk cache of final statement analyses keyed by the SHA-256
+    of the uploaded bytes. File mtime is the LRU clock: hits touch the entry
+    and the least recently used entries are evicted above max_bytes.
+    """
+
+    def __init__(self, directory=STATEMENT_CACHE_DIR, max_bytes=STATEMENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest):
+        path = self._path(digest)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return result
+
+    def put(self, digest, result):
+        path = self._path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            sizes = [e.stat().st_size for e in os.scandir(self.directory) if e.name.endswith(".json")]
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(sizes),
+                "bytes": sum(sizes),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = StatementResultCache()
+    return _result_cache
@@ -0,0 +1,159 @@
+import re
+
+from agents.uploads import open_pdf
+
+# Bilinen ekstre düzenleri için kural tabanlı ayrıştırıcılar. Tarih, açıklama, işaretli tutar
+# ve (varsa) kart limiti yerel olarak çıkarılır; LLM yalnızca kategori için kullanılır.
+
+DATE_RE = re.compile(r"^(\d{2})[./](\d{2})[./](\d{4})$")
+MONEY_TAIL_RE = re.compile(
+    r"^(?P<label>.*?)\s*(?P<sign>[+-])\s*(?P<amount>[\d.]+\s*,\s*\d{2})\s*TL"
+    r"\s+(?P<balance>-?\s*[\d.]+\s*,\s*\d{2})\s*TL\s*$"
+)
+EARNED_POINTS_RE = re.compile(r"\s*KAZANILAN\s*\S*PUAN\s*:?\s*[\d.,]+", re.IGNORECASE)
+POINT_KEYWORDS = ("PUAN", "BONUS YÜKLEME", "REWARD POINT")
+INTERNAL_MOVEMENT_KEYWORDS = ("HESAPTAN AKTARIM", "ACCOUNT MOVEMENT", "MONEY MOVEMENT")
+# "Ad Soyad / Unvan : AD SOYAD TCKN / VKN / YKN : ..." — iki nokta öncesinde boşluk olabilir
+CUSTOMER_NAME_RE = re.compile(r"Unvan\s*:\s*(.+?)\s*(?:\bTCKN\b|\n|$)")
+
+# Aynı satıra ait kelimeler arasındaki en büyük dikey fark (pt); satır aralığı ~14 pt
+ROW_TOLERANCE = 8
+
+
+def _clean_amount(text):
+    return re.sub(r"\s+", "", text) + " TL"
+
+
+def clean_description(description):
+    """Removes earned-point suffixes and returns None for point / internal operations (not real money flow)."""
+    description = EARNED_POINTS_RE.sub("", description).strip()
+    upper = description.upper()
+    if any(k in upper for k in POINT_KEYWORDS) or any(k in upper for k in INTERNAL_MOVEMENT_KEYWORDS):
+        return None
+    return re.sub(r"\s+", " ", description)
+
+
+def _group_rows(words, date_x1):
+    """Anchors a row on every date in the first column and attaches each word to the nearest anchor."""
+    anchors = [w for w in words if w["x1"] <= date_x1 and DATE_RE.match(w["text"])]
+    anchor_ids = {id(a) for a in anchors}
+    rows = [{"date": a, "words": []} for a in anchors]
+    for w in words:
+        if not rows or id(w) in anchor_ids:
+            continue
+        row = min(rows, key=lambda r: abs(r["date"]["top"] - w["top"]))
+        if abs(row["date"]["top"] - w["top"]) <= ROW_TOLERANCE:
+            row["words"].append(w)
+    return rows
+
+
+class GarantiAccountMovementsLayout:
+    """
+    Garanti BBVA e-imzalı "Hesap Hareketleri" (account movements) statement:
+    columns Tarih | Açıklama | Etiket | Tutar | Bakiye with signed TL amounts.
+    """
+
+    name = "garanti_account_movements"
+    header = ("Tarih", "Açıklama", "Tutar", "Bakiye")
+
+    def matches(self, first_page_text):
+        return "Hesap Hareketleri" in first_page_text and all(h in first_page_text for h in self.header)
+
+    def customer_info(self, first_page_text):
+        """
+        Customer name from the "Ad Soyad / Unvan" header line, else from the "Sayın ..." salutation.
+
+        >>> GarantiAccountMovementsLayout().customer_info(
+        ...     "Ad Soyad / Unvan : AYŞE NUR YILMAZ TCKN / VKN / YKN : 12345678901\\nHesap Numarası : 1234567 Bakiye : 1.758,17 TL")
+        {'full_name': 'AYŞE NUR YILMAZ'}
+        >>> GarantiAccountMovementsLayout().customer_info("Sayın AYŞE NUR YILMAZ, T.Garanti Bankası A.Ş. müşterisidir.")
+        {'full_name': 'AYŞE NUR YILMAZ'}
+        """
+        match = CUSTOMER_NAME_RE.search(first_page_text)
+        if not match:
+            match = re.search(r"Sayın\s+(.+?),", first_page_text)
+        return {"full_name": match.group(1).strip() if match else None}
+
+    def _columns(self, words):
+        columns = {}
+        for w in words:
+            if w["text"] in ("Tarih", "Açıklama", "Etiket", "Tutar", "Bakiye") and w["text"] not in columns:
+                columns[w["text"]] = w
+        if not all(h in columns for h in self.header):
+            return None
+        return columns
+
+    def parse_page(self, page):
+        words = page.extract_words(keep_blank_chars=False)
+        columns = self._columns(words)
+        if columns is None:
+            return []
+
+        description_x = columns["Açıklama"]["x0"] - 2
+        label_x = columns["Etiket"]["x0"] - 2 if "Etiket" in columns else None
+        table_words = [w for w in words if w["top"] > columns["Tarih"]["bottom"]]
+
+        transactions = []
+        for row in _group_rows(table_words, description_x):
+            cells = sorted(row["words"], key=lambda w: (w["x0"], w["top"]))
+            description_words = [w for w in cells if w["x0"] >= description_x and (label_x is None or w["x0"] < label_x)]
+            tail_words = [w for w in cells if label_x is not None and w["x0"] >= label_x]
+            # Açıklama iki satıra taşabilir: önce üst satır, sonra alt satır
+            description = " ".join(w["text"] for w in sorted(description_words, key=lambda w: (round(w["top"]), w["x0"])))
+            if label_x is None:
+                tail, description = description, ""
+            else:
+                tail = " ".join(w["text"] for w in tail_words)
+
+            match = MONEY_TAIL_RE.match(tail)
+            if not match:
+                continue
+            if label_x is None:
+                description = match.group("label")
+
+            description = clean_description(description)
+            if not description:
+                continue
+
+            day, month, year = DATE_RE.match(row["date"]["text"]).groups()
+            transactions.append({
+                "date": f"{day}/{month}/{year}",
+                "description": description,
+                "label": match.group("label").strip() if label_x is not None else None,
+                "amount": _clean_amount(match.group("amount")),
+                "flow": "spending" if match.group("sign") == "-" else "income",
+            })
+        return transactions
+
+
+KNOWN_LAYOUTS = [GarantiAccountMovementsLayout()]
+
+
+def parse_known_statement(pdf_source):
+    """
+    Parses the statement locally if its layout is recognized. Returns None for
+    unknown layouts, otherwise {"layout", "customer_info", "card_limit", "transactions"}
+    where transactions have no spending_category yet.
+    """
+    with open_pdf(pdf_source) as pdf:
+        if not pdf.pages:
+            return None
+        first_page_text = pdf.pages[0].extract_text() or ""
+        layout = next((l for l in KNOWN_LAYOUTS if l.matches(first_page_text)), None)
+        if layout is None:
+            return None
+
+        transactions = []
+        for page in pdf.pages:
+            transactions.extend(layout.parse_page(page))
+            page.flush_cache()
+
+    if not transactions:
+        return None
+    return {
+        "layout": layout.name,
+        "customer_info": layout.customer_info(first_page_text),
+        # Hesap hareketleri dökümünde kart limiti bulunmaz
+        "card_limit": {"total_card_limit": None, "remaining_card_limit": None},
+        "transactions": transactions,
+    }
@@ -0,0 +1,65 @@
+import os
+import hashlib
+import tempfile
+
+# Bu boyutun altındaki yüklemeler bellekte tutulur, üstü benzersiz adlı geçici dosyaya taşar
+UPLOAD_MEMORY_LIMIT_BYTES = int(os.getenv("UPLOAD_MEMORY_LIMIT_BYTES", str(16 * 1024 * 1024)))
+_READ_BLOCK_BYTES = 1024 * 1024
+
+
+class BufferedUpload:
+    """
+    An uploaded file read once into a SpooledTemporaryFile (memory up to
+    UPLOAD_MEMORY_LIMIT_BYTES, then an anonymous unique temp file), with its
+    SHA-256 computed on the way in. Concurrent uploads with the same filename
+    never share storage.
+    """
+
+    def __init__(self, file_storage, memory_limit=UPLOAD_MEMORY_LIMIT_BYTES):
+        self.filename = file_storage.filename
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=memory_limit, prefix="upload-", suffix=".pdf")
+        digest = hashlib.sha256()
+        size = 0
+        stream = file_storage.stream
+        for block in iter(lambda: stream.read(_READ_BLOCK_BYTES), b""):
+            digest.update(block)
+            self.buffer.write(block)
+            size += len(block)
+        self.size = size
+        self.sha256 = digest.hexdigest()
+        self.buffer.seek(0)
+
+    @property
+    def in_memory(self):
+        return not getattr(self.buffer, "_rolled", False)
+
+    @property
+    def path(self):
+        """Name of the spill file when it has one (anonymous on POSIX), else None."""
+        name = getattr(self.buffer, "name", None)
+        return name if isinstance(name, str) else None
+
+    def open(self):
+        """Rewinds the buffer and returns a file object pdfplumber can open directly."""
+        self.buffer.seek(0)
+        return self.buffer
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_pdf(source):
+    """pdfplumber.open for a path, a file object or a BufferedUpload."""
+    import pdfplumber
+
+    if isinstance(source, BufferedUpload):
+        source = source.open()
+    elif hasattr(source, "seek"):
+        source.seek(0)
+    return pdfplumber.open(source)
@@ -0,0 +1,278 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# "atlas": MongoDB Atlas $vectorSearch, "local": süreç içi NumPy indeksi (çevrimdışı çalışır)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "atlas")
+EMBEDDING_DIMENSIONS = 768
+
+# Atlas $vectorSearch ayarları; indeks userId alanını "filter" tipinde içermeli
+VECTOR_SEARCH_INDEX = os.getenv("VECTOR_SEARCH_INDEX", "vector_index")
+VECTOR_SEARCH_NUM_CANDIDATES = int(os.getenv("VECTOR_SEARCH_NUM_CANDIDATES", "200"))
+VECTOR_SEARCH_LIMIT = int(os.getenv("VECTOR_SEARCH_LIMIT", "80"))
+VECTOR_SEARCH_CONCURRENCY = int(os.getenv("VECTOR_SEARCH_CONCURRENCY", "4"))
+
+# Yerel indeks: float32 ya da int8 (satır başına ölçekli, ~4x daha az bellek)
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+VECTOR_INDEX_MAX_USERS = int(os.getenv("VECTOR_INDEX_MAX_USERS", "256"))
+# İşlemleri Node backend'i kaydeder; yerel indeks yeni belgeleri koleksiyonu en fazla bu sıklıkla yoklayarak alır
+VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "30"))
+
+
+def user_filter(user_id):
+    """{"userId": ObjectId(...)} for a valid ObjectId string, the raw value otherwise; {} for None."""
+    if user_id is None:
+        return {}
+    from bson import ObjectId
+
+    return {"userId": ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id}
+
+
+class VectorMatrix:
+    """
+    Contiguous, row-normalized embedding matrix with amortized O(1) appends,
+    so cosine top-k for a batch of queries is a single matrix product. With
+    dtype="int8" rows are quantized symmetrically with one float32 scale each.
+    """
+
+    def __init__(self, dims=EMBEDDING_DIMENSIONS, dtype=VECTOR_INDEX_DTYPE, capacity=256):
+        import numpy as np
+
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self._np = np
+        self.dims = dims
+        self.quantized = dtype == "int8"
+        self._rows = np.zeros((capacity, dims), dtype=np.int8 if self.quantized else np.float32)
+        self._scales = np.ones(capacity, dtype=np.float32)
+        self.size = 0
+        self.docs = []
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self._rows)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        rows = self._np.zeros((capacity, self.dims), dtype=self._rows.dtype)
+        rows[:self.size] = self._rows[:self.size]
+        scales = self._np.ones(capacity, dtype=self._np.float32)
+        scales[:self.size] = self._scales[:self.size]
+        self._rows, self._scales = rows, scales
+
+    def add(self, items):
+        """
+        Adds or replaces (id, vector, doc) items. Vectors with the wrong
+        dimension or zero norm are skipped. Returns the number stored.
+        """
+        np = self._np
+        ids, vectors, docs = [], [], []
+        for item_id, vector, doc in items:
+            if vector is None or len(vector) != self.dims:
+                continue
+            ids.append(item_id)
+            vectors.append(vector)
+            docs.append(doc)
+        if not vectors:
+            return 0
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        keep = norms > 0
+        matrix = matrix[keep] / norms[keep, None]
+        ids = [i for i, k in zip(ids, keep) if k]
+        docs = [d for d, k in zip(docs, keep) if k]
+        if self.quantized:
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            rows = np.rint(matrix / scales[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(matrix), dtype=np.float32)
+            rows = matrix
+
+        with self._lock:
+            self._grow(self.size + len(ids))
+            for item_id, row, scale, doc in zip(ids, rows, scales, docs):
+                position = self._positions.get(item_id)
+                if position is None:
+                    position = self.size
+                    self._positions[item_id] = position
+                    self.docs.append(doc)
+                    self.size += 1
+                else:
+                    self.docs[position] = doc
+                self._rows[position] = row
+                self._scales[position] = scale
+        return len(ids)
+
+    def search(self, queries, top_k):
+        """Returns, per query vector, [(doc, cosine score)] best first."""
+        np = self._np
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dims)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+
+        with self._lock:
+            size = self.size
+            if size == 0 or top_k <= 0:
+                return [[] for _ in queries]
+            # (satır x sorgu) skor matrisi tek çarpımla; int8 satırlar ölçekle geri çevrilir
+            scores = self._rows[:size] @ queries.T
+            if self.quantized:
+                scores *= self._scales[:size, None]
+            docs = list(self.docs[:size])
+
+        k = min(top_k, size)
+        top = np.argpartition(-scores, k - 1, axis=0)[:k] if k < size else np.tile(np.arange(size)[:, None], (1, len(queries)))
+        results = []
+        for column in range(len(queries)):
+            indices = top[:, column]
+            ordered = indices[np.argsort(-scores[indices, column], kind="stable")]
+            results.append([(docs[i], float(scores[i, column])) for i in ordered])
+        return results
+
+    def nbytes(self):
+        return int(self._rows[:self.size].nbytes + (self._scales[:self.size].nbytes if self.quantized else 0))
+
+
+class AtlasVectorBackend:
+    """$vectorSearch on the transactions collection, one aggregation per query vector, run concurrently."""
+
+    name = "atlas"
+
+    def __init__(self, collection_getter, index=VECTOR_SEARCH_INDEX, concurrency=VECTOR_SEARCH_CONCURRENCY):
+        self._collection = collection_getter
+        self.index = index
+        self.concurrency = concurrency
+
+    def search(self, user_id, query_vectors, top_k=VECTOR_SEARCH_LIMIT, num_candidates=VECTOR_SEARCH_NUM_CANDIDATES):
+        """query_vectors: {keyword: vector}. Returns {keyword: [doc with "score"]}, best first."""
+        vector_search = {
+            "index": self.index,
+            "path": "embeddings",
+            "numDimensions": EMBEDDING_DIMENSIONS,
+            # Atlas numCandidates >= limit ister
+            "numCandidates": max(num_candidates, top_k),
+            "limit": top_k,
+        }
+        if user_id is not None:
+            # Aday havuzu yalnızca bu kullanıcının işlemlerinden oluşur
+            vector_search["filter"] = user_filter(user_id)
+
+        def search(item):
+            keyword, vector = item
+            results = self._collection().aggregate(
+                [
+                    {"$vectorSearch": {**vector_search, "queryVector": vector}},
+                    # embeddings alanı sunucuda çıkarılır; skor birleştirme için eklenir
+                    {"$project": {"embeddings": 0, "score": {"$meta": "vectorSearchScore"}}},
+                ]
+            )
+            return keyword, list(results)
+
+        if not query_vectors:
+            return {}
+        workers = max(1, min(self.concurrency, len(query_vectors)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-search") as pool:
+            return dict(pool.map(search, query_vectors.items()))
+
+    def stats(self):
+        return {"backend": self.name, "index": self.index}
+
+
+class LocalVectorBackend:
+    """
+    In-process alternative to Atlas: one VectorMatrix per user (LRU-bounded),
+    loaded from the collection on first use. Transactions are saved to the
+    collection by the backend, not by this service, so new ones are pulled
+    by _id (only documents after the last one seen) on a search at most every
+    VECTOR_INDEX_REFRESH_SECONDS; the matrix is appended to, never rebuilt.
+    """
+
+    name = "local"
+
+    def __init__(self, collection_getter, dtype=VECTOR_INDEX_DTYPE, max_users=VECTOR_INDEX_MAX_USERS,
+                 refresh_seconds=VECTOR_INDEX_REFRESH_SECONDS, dims=EMBEDDING_DIMENSIONS):
+        self._collection = collection_getter
+        self.dtype = dtype
+        self.dims = dims
+        self.max_users = max_users
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        # user_id -> {"matrix", "last_id", "refreshed_at", "lock"}
+        self._users = OrderedDict()
+        self.searches = 0
+        self.loads = 0
+
+    def _entry(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = {"matrix": VectorMatrix(self.dims, self.dtype), "last_id": None, "refreshed_at": 0.0,
+                         "lock": threading.Lock()}
+                self._users[user_id] = entry
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            return entry
+
+    @staticmethod
+    def _items(docs):
+        for doc in docs:
+            doc = dict(doc)
+            vector = doc.pop("embeddings", None)
+            if isinstance(vector, list) and vector:
+                yield str(doc.get("_id")), vector, doc
+
+    def _refresh(self, user_id, entry, force=False):
+        with entry["lock"]:
+            if not force and time.time() - entry["refreshed_at"] < self.refresh_seconds:
+                return
+            query = user_filter(user_id)
+            if entry["last_id"] is not None:
+                query["_id"] = {"$gt": entry["last_id"]}
+            docs = list(self._collection().find(query).sort("_id", 1))
+            if docs:
+                entry["matrix"].add(self._items(docs))
+                entry["last_id"] = docs[-1]["_id"]
+                self.loads += 1
+            entry["refreshed_at"] = time.time()
+
+    def search(self, user_id, query_vectors, top_k=VECTOR_SEARCH_LIMIT, num_candidates=VECTOR_SEARCH_NUM_CANDIDATES):
+        """query_vectors: {keyword: vector}. Returns {keyword: [doc with "score"]}, best first."""
+        if not query_vectors:
+            return {}
+        entry = self._entry(user_id)
+        self._refresh(user_id, entry)
+        keywords = list(query_vectors)
+        # Tüm anahtar kelimeler tek matris çarpımında skorlanır
+        results = entry["matrix"].search([query_vectors[k] for k in keywords], top_k)
+        self.searches += 1
+        return {k: [{**doc, "score": score} for doc, score in hits] for k, hits in zip(keywords, results)}
+
+    def stats(self):
+        with self._lock:
+            users = list(self._users.values())
+        return {
+            "backend": self.name,
+            "dtype": self.dtype,
+            "users": len(users),
+            "vectors": sum(len(u["matrix"]) for u in users),
+            "bytes": sum(u["matrix"].nbytes() for u in users),
+            "searches": self.searches,
+            "loads": self.loads,
+        }
+
+
+def make_vector_backend(collection_getter, name=VECTOR_BACKEND):
+    if name == "local":
+        return LocalVectorBackend(collection_getter)
+    if name == "atlas":
+        return AtlasVectorBackend(collection_getter)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {name}")
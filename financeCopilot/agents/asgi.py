@@ -0,0 +1,267 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
+from werkzeug.datastructures import FileStorage
+
+from agents.baseAgent import configure_genai
+from agents.chat_service import handle_chat, stream_chat, ndjson_line, orchestrator, is_truthy, AGENT_EXECUTOR_WORKERS
+from agents.batch_service import handle_batch, stream_batch
+from agents.job_tracking import job_status, aiter_job_events, IDLE_STATUS
+from agents.conversation_memory import user_key_from_form
+from agents.llm_scheduler import llm_scheduler
+from agents.llm_metrics import llm_metrics, PROMETHEUS_CONTENT_TYPE
+from agents.merchant_cache import get_merchant_cache
+from agents.result_cache import get_result_cache
+from agents.ingestion_index import get_transaction_index
+from agents.budgetPlannerAgent import get_budget_planner, preload_category_embeddings
+from agents.embedding_cache import get_embedding_cache
+from agents.market_prices import get_current_market_prices_fast
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # asyncio.to_thread ve run_in_executor(None, ...) bu havuzu kullanır,
+    # böylece tüm istekler tek uzun ömürlü döngüyü ve sınırlı sayıda thread'i paylaşır.
+    executor = ThreadPoolExecutor(max_workers=AGENT_EXECUTOR_WORKERS, thread_name_prefix="agent-io")
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(executor)
+    # Kategori embedding'leri arka planda yüklenir; açılışı bekletmez
+    loop.run_in_executor(None, preload_category_embeddings)
+    yield
+    executor.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "Accept"],
+    expose_headers=["Content-Type", "Authorization"],
+)
+
+
+@app.post("/chat")
+async def handle_user_input(request: Request):
+    try:
+        form = await request.form()
+        user_text = form.get("message")
+        upload = form.get("file")
+        user = form.get("user")
+        job_id = form.get("job_id")
+
+        # Ajanlar Flask'teki FileStorage arayüzünü (filename / save) bekliyor
+        uploaded_file = None
+        if upload is not None and getattr(upload, "filename", None):
+            uploaded_file = FileStorage(stream=upload.file, filename=upload.filename, content_type=upload.content_type)
+
+        # stream=true: NDJSON olarak kısmi alanlar + son yanıt
+        if is_truthy(form.get("stream") or request.query_params.get("stream")):
+            if not user_text and not uploaded_file:
+                return JSONResponse({"success": False, "message": "Message or file is required"}, status_code=400)
+            events = stream_chat(user_text, uploaded_file, user, job_id)
+            return StreamingResponse(
+                (ndjson_line(event) async for event in events),
+                media_type="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        body, status = await handle_chat(user_text, uploaded_file, user, job_id)
+        return JSONResponse(body, status_code=status)
+
+    except Exception as e:
+        print(f"Error in handle_user_input: {e}")
+        return JSONResponse({
+            "success": False,
+            "message": "An error occurred while processing your request",
+            "error": str(e),
+        }, status_code=500)
+
+
+# Birden fazla ekstre: yönlendirme yapılmadan doğrudan harcama analizine gider
+@app.post("/analyze-statements")
+async def handle_statement_batch(request: Request):
+    try:
+        form = await request.form()
+        user = form.get("user")
+        job_id = form.get("job_id")
+        uploaded_files = [
+            FileStorage(stream=upload.file, filename=upload.filename, content_type=upload.content_type)
+            for upload in form.getlist("files")
+            if getattr(upload, "filename", None)
+        ]
+
+        # stream=true: her dosyanın sonucu bittiği anda NDJSON satırı olarak gönderilir
+        if is_truthy(form.get("stream") or request.query_params.get("stream")):
+            events = stream_batch(uploaded_files, user, job_id)
+            return StreamingResponse(
+                (ndjson_line(event) async for event in events),
+                media_type="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        body, status = await handle_batch(uploaded_files, user, job_id)
+        return JSONResponse(body, status_code=status)
+
+    except Exception as e:
+        print(f"Error in handle_statement_batch: {e}")
+        return JSONResponse({
+            "success": False,
+            "message": "An error occurred while processing your request",
+            "error": str(e),
+        }, status_code=500)
+
+
+@app.post("/budget-analysis")
+async def handle_budget_analysis(request: Request):
+    """
+    Endpoint to handle budget analysis requests.
+    """
+    try:
+        data = await request.json()
+        userId = data.get("userId")
+
+        if not userId:
+            return JSONResponse({"success": False, "message": "userId is required"}, status_code=400)
+
+        result = await asyncio.to_thread(get_budget_planner().run_budget_analysis, userId)
+
+        if not result:
+            return JSONResponse({"success": False, "message": "No data available for analysis"}, status_code=404)
+
+        return {"success": True, "response": result}
+
+    except Exception as e:
+        print(f"Error in handle_budget_analysis: {e}")
+        return JSONResponse({
+            "success": False,
+            "message": "An error occurred while processing your request",
+            "error": str(e)
+        }, status_code=500)
+
+
+@app.post("/embeddings")
+async def get_embeddings(request: Request):
+    try:
+        data = await request.json()
+        text = data.get("text")
+
+        if not text:
+            return JSONResponse({"success": False, "message": "Text is required"}, status_code=400)
+
+        import google.generativeai as genai
+        configure_genai()
+        result = await genai.embed_content_async(
+            model="models/embedding-001",
+            content=text,
+            task_type="retrieval_document"
+        )
+
+        return {"success": True, "embeddings": result["embedding"]}
+
+    except Exception as e:
+        print(f"Error in get_embeddings: {e}")
+        return JSONResponse({
+            "success": False,
+            "message": "Internal server error",
+            "error": str(e)
+        }, status_code=500)
+
+
+# Bir kullanıcıya ait işler yalnızca aynı kullanıcıya (?user=<id>) gösterilir
+@app.get("/job-status/{job_id}")
+async def get_job_status(job_id: str, user: str | None = None):
+    job = job_status.get(job_id, requester=user_key_from_form(user))
+    if not job:
+        return {"success": True, "status": IDLE_STATUS}
+    return {"success": True, "status": job}
+
+
+@app.get("/job-status/{job_id}/stream")
+async def stream_job_status(job_id: str, user: str | None = None):
+    return StreamingResponse(
+        aiter_job_events(job_id, requester=user_key_from_form(user)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/router-stats")
+async def get_router_stats():
+    return {"success": True, "stats": orchestrator.intent_router.stats(), "transport": orchestrator.transport_stats()}
+
+
+@app.get("/llm-stats")
+async def get_llm_stats():
+    return {"success": True, "scheduler": llm_scheduler.stats()}
+
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    merchant_stats, result_stats, ingestion_stats, embedding_stats, vector_stats = await asyncio.gather(
+        asyncio.to_thread(lambda: get_merchant_cache().stats()),
+        asyncio.to_thread(lambda: get_result_cache().stats()),
+        asyncio.to_thread(lambda: get_transaction_index().stats()),
+        asyncio.to_thread(lambda: get_embedding_cache().stats()),
+        asyncio.to_thread(lambda: get_budget_planner().vector_backend.stats()),
+    )
+    return {
+        "success": True,
+        "merchant_categories": merchant_stats,
+        "statement_results": result_stats,
+        "ingested_transactions": ingestion_stats,
+        "embeddings": embedding_stats,
+        "vector_index": vector_stats,
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(llm_metrics.render(llm_scheduler.stats()), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.post("/export-transaction")
+async def transaction_export(request: Request):
+    from agents.exportReportAgent import generate_transaction_pdf
+
+    data = await request.json()
+    path = await asyncio.to_thread(generate_transaction_pdf, data)
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+@app.post("/export-budget")
+async def budget_export(request: Request):
+    from agents.exportReportAgent import generate_budget_pdf
+
+    data = await request.json()
+    path = await asyncio.to_thread(generate_budget_pdf, data)
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+@app.get("/market-prices")
+async def fetch_market_prices():
+    start = time.time()
+    prices = await asyncio.to_thread(get_current_market_prices_fast, "./agents/financeAgent/sp500_symbols.txt")
+    elapsed = time.time() - start
+
+    with open("./agents/financeAgent/market_prices_output.txt", "w") as f:
+        for p in prices:
+            f.write(p + "\n")
+        f.write(f"\nExecution Time: {elapsed:.2f} seconds\n")
+
+    return {"status": "success", "method": "yfinance", "execution_time": elapsed}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print("Starting ASGI server on port 5001...")
+    uvicorn.run(app, port=5001, host="0.0.0.0")
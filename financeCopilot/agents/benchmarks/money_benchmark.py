@@ -0,0 +1,119 @@
+"""
+Correctness checks and microbenchmark for agents/money.py.
+
+Runs the parsing / formatting examples in agents/money.py (also runnable on
+their own with `python -m doctest agents/money.py`), checks that category
+totals match the old per-transaction string churn in categorize_pdf, then
+times that old path against the single-pass minor-unit path.
+
+Usage (from financeCopilot/agents):
+    python benchmarks/money_benchmark.py
+    python benchmarks/money_benchmark.py --count 200000 --repeat 5
+"""
+import os
+import sys
+import random
+import doctest
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import money  # noqa: E402
+from agents.money import parse_minor, parse_minor_many, normalize_many, format_minor  # noqa: E402
+
+
+# categorize_pdf'in eski hali: her işlemde .replace zinciri ve her adımda toplamı yeniden ayrıştırma
+def legacy_categorize_totals(transactions):
+    for t in transactions:
+        raw_amount = t.get("amount", "")
+        try:
+            amount_number = float(raw_amount.replace(".", "").replace(",", ".").replace(" TL", "").replace("-", "").strip())
+            t["amount"] = f"{amount_number:,.2f} TL".replace(",", "X").replace(".", ",").replace("X", ".")
+        except (ValueError, TypeError):
+            pass
+    totals = {}
+    for t in transactions:
+        if t.get("flow") != "spending":
+            continue
+        cat = t.get("spending_category")
+        try:
+            val = float(t["amount"].replace(".", "").replace(",", ".").replace(" TL", ""))
+            prev_val = float(totals.get(cat, "0,00 TL").replace(".", "").replace(",", ".").replace(" TL", ""))
+            totals[cat] = f"{val + prev_val:,.2f} TL".replace(",", "X").replace(".", ",").replace("X", ".")
+        except Exception:
+            pass
+    return totals
+
+
+def single_pass_totals(transactions):
+    category_minor = {}
+    for t, (minor, text) in zip(transactions, normalize_many(t.get("amount") for t in transactions)):
+        if minor is None:
+            continue
+        t["amount"] = text
+        if t.get("flow") == "spending":
+            cat = t.get("spending_category")
+            category_minor[cat] = category_minor.get(cat, 0) + minor
+    return {cat: format_minor(total) for cat, total in category_minor.items()}
+
+
+def make_transactions(count, seed=7):
+    rng = random.Random(seed)
+    categories = ["food_drinks", "groceries", "transportation", "subscription", "other"]
+    transactions = []
+    for _ in range(count):
+        minor = rng.randint(1, 2_500_000)
+        sign = "-" if rng.random() < 0.8 else "+"
+        transactions.append({
+            "amount": sign + format_minor(minor),
+            "flow": "spending" if sign == "-" else "income",
+            "spending_category": rng.choice(categories),
+        })
+    return transactions
+
+
+def check_correctness():
+    failures = []
+    doctests = doctest.testmod(money)
+    if doctests.failed:
+        failures.append(f"{doctests.failed} of {doctests.attempted} agents/money.py doctests failed")
+
+    # Eski toplam hesabıyla aynı sonucu vermeli (kayan nokta yuvarlaması olmadan)
+    legacy = legacy_categorize_totals(make_transactions(2000))
+    new = single_pass_totals(make_transactions(2000))
+    if legacy != new:
+        diff = {k: (legacy.get(k), new.get(k)) for k in set(legacy) | set(new) if legacy.get(k) != new.get(k)}
+        failures.append(f"category totals differ from the legacy path: {diff}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50_000, help="transactions per run")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = check_correctness()
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        raise SystemExit(1)
+    print("✅ agents/money.py doctests and legacy total parity passed\n")
+
+    base = make_transactions(args.count)
+    legacy_s = min(timeit.repeat(lambda: legacy_categorize_totals([dict(t) for t in base]), number=1, repeat=args.repeat))
+    new_s = min(timeit.repeat(lambda: single_pass_totals([dict(t) for t in base]), number=1, repeat=args.repeat))
+    amounts = [t["amount"] for t in base]
+    scalar_s = min(timeit.repeat(lambda: [parse_minor(a) for a in amounts], number=1, repeat=args.repeat))
+    many_s = min(timeit.repeat(lambda: parse_minor_many(amounts), number=1, repeat=args.repeat))
+
+    print(f"⏱️  {args.count} transactions, best of {args.repeat}")
+    print(f"  legacy normalize + totals:   {legacy_s * 1000:8.1f} ms")
+    print(f"  single-pass minor units:     {new_s * 1000:8.1f} ms  ({legacy_s / new_s:.2f}x)")
+    print(f"  parse_minor per amount:      {scalar_s * 1000:8.1f} ms")
+    print(f"  parse_minor_many (fast path):{many_s * 1000:8.1f} ms  ({scalar_s / many_s:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
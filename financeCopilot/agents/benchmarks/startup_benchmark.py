@@ -0,0 +1,122 @@
+"""
+Startup benchmark for the agents service.
+
+Reports per-module import cost (from `python -X importtime`) and the
+time-to-first-request of a fresh interpreter for the Flask (main) or
+ASGI (asgi) app.
+
+Usage (from financeCopilot/agents):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --target asgi --top 30 --runs 5
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Yeni bir yorumlayıcıda uygulamayı import edip ilk isteği atar ve süreleri JSON olarak yazar
+_FIRST_REQUEST_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+target = sys.argv[1]
+path = sys.argv[2]
+if target == "asgi":
+    from fastapi.testclient import TestClient
+    import asgi
+    t1 = time.perf_counter()
+    with TestClient(asgi.app) as client:
+        status = client.get(path).status_code
+else:
+    import main
+    t1 = time.perf_counter()
+    status = main.create_app().test_client().get(path).status_code
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "first_request_s": t2 - t1, "status": status}))
+"""
+
+
+def run_importtime(target):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=AGENTS_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit(f"❌ 'import {target}' failed")
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000, "depth": (len(indent) - 1) // 2})
+    return modules
+
+
+def summarize_by_package(modules):
+    # Alt modüllerin kendi sürelerini kök pakete göre toplar (ör. google.*, matplotlib.*)
+    totals = {}
+    for m in modules:
+        root = m["module"].split(".")[0]
+        totals[root] = totals.get(root, 0.0) + m["self_ms"]
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def run_first_request(target, path, runs):
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", _FIRST_REQUEST_SNIPPET, target, path],
+            cwd=AGENTS_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:])
+            raise SystemExit("❌ First-request run failed")
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["main", "asgi"], default="main")
+    parser.add_argument("--path", default="/router-stats", help="route hit as the first request")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    modules = run_importtime(args.target)
+    total_ms = sum(m["self_ms"] for m in modules)
+
+    print(f"📦 import {args.target}: {total_ms:.1f} ms across {len(modules)} modules\n")
+    print("Import time by top-level package (self time of all submodules):")
+    for name, ms in summarize_by_package(modules)[: args.top]:
+        print(f"  {ms:10.1f} ms  {name}")
+
+    print("\nSlowest individual modules (self time):")
+    for m in sorted(modules, key=lambda m: m["self_ms"], reverse=True)[: args.top]:
+        print(f"  {m['self_ms']:10.1f} ms  {m['module']}")
+
+    samples = run_first_request(args.target, args.path, args.runs)
+    imports = [s["import_s"] * 1000 for s in samples]
+    firsts = [s["first_request_s"] * 1000 for s in samples]
+    ttfr = [i + f for i, f in zip(imports, firsts)]
+    print(f"\n⏱️  {args.runs} fresh interpreter(s), first request GET {args.path} -> {samples[-1]['status']}")
+    print(f"  app import:            median {statistics.median(imports):8.1f} ms")
+    print(f"  first request:         median {statistics.median(firsts):8.1f} ms")
+    print(f"  time-to-first-request: median {statistics.median(ttfr):8.1f} ms (min {min(ttfr):.1f}, max {max(ttfr):.1f})")
+
+
+if __name__ == "__main__":
+    main()
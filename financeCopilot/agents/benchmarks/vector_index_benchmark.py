@@ -0,0 +1,135 @@
+"""
+Correctness checks and microbenchmark for agents/vector_index.py.
+
+Builds a synthetic user with clustered 768-dim transaction embeddings,
+checks the float32 index against brute-force cosine ranking, measures int8
+recall@k, exercises incremental loading through LocalVectorBackend with an
+in-memory collection, and times top-k for a batch of focus keywords.
+
+Usage (from financeCopilot/agents):
+    python benchmarks/vector_index_benchmark.py
+    python benchmarks/vector_index_benchmark.py --count 20000 --top-k 80 --repeat 200
+"""
+import os
+import sys
+import argparse
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.vector_index import VectorMatrix, LocalVectorBackend, EMBEDDING_DIMENSIONS  # noqa: E402
+
+
+def make_embeddings(count, clusters=13, seed=7, dims=EMBEDDING_DIMENSIONS):
+    # Kategori merkezleri etrafında kümelenmiş vektörler (gerçek işlem embedding'lerine benzer)
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(count, dims)).astype(np.float32)
+    return centers, vectors
+
+
+def brute_force(vectors, queries, top_k):
+    matrix = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = matrix @ queries.T
+    return [list(np.argsort(-scores[:, q], kind="stable")[:top_k]) for q in range(len(queries))]
+
+
+class MemoryCursor(list):
+    def sort(self, key, direction):
+        return MemoryCursor(sorted(self, key=lambda d: d[key], reverse=direction < 0))
+
+
+class MemoryCollection:
+    """Just enough of a pymongo collection for LocalVectorBackend (find + sort on _id)."""
+
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query):
+        docs = [d for d in self.docs if d["userId"] == query.get("userId")]
+        after = query.get("_id", {}).get("$gt")
+        if after is not None:
+            docs = [d for d in docs if d["_id"] > after]
+        return MemoryCursor(docs)
+
+
+def check_correctness(vectors, queries, top_k):
+    failures = []
+    expected = brute_force(vectors, queries, top_k)
+    items = [(i, v, {"_id": i}) for i, v in enumerate(vectors)]
+
+    exact = VectorMatrix(dtype="float32", capacity=16)
+    exact.add(items)
+    for q, hits in enumerate(exact.search(queries, top_k)):
+        got = [doc["_id"] for doc, _ in hits]
+        if got != [int(i) for i in expected[q]]:
+            failures.append(f"float32 top-{top_k} differs from brute force for query {q}")
+
+    quantized = VectorMatrix(dtype="int8")
+    quantized.add(items)
+    recalls = []
+    for q, hits in enumerate(quantized.search(queries, top_k)):
+        got = {doc["_id"] for doc, _ in hits}
+        recalls.append(len(got & {int(i) for i in expected[q]}) / top_k)
+    recall = sum(recalls) / len(recalls)
+    if recall < 0.9:
+        failures.append(f"int8 recall@{top_k} too low: {recall:.3f}")
+
+    # Aynı id tekrar eklenirse satır güncellenir, boyut değişmez
+    exact.add([(0, vectors[1], {"_id": 0, "replaced": True})])
+    best_two = {doc["_id"] for doc, _ in exact.search(vectors[1:2], 2)[0]}
+    if len(exact) != len(vectors) or not exact.docs[0].get("replaced") or best_two != {0, 1}:
+        failures.append("re-adding an id did not replace its row")
+
+    # Yerel arka uç: ilk aramada yükleme, sonra _id üzerinden artımlı ekleme
+    collection = MemoryCollection()
+    half = len(vectors) // 2
+    collection.docs = [{"_id": i, "userId": "u1", "embeddings": v.tolist()} for i, v in enumerate(vectors[:half])]
+    collection.docs.append({"_id": len(vectors) + 1, "userId": "u2", "embeddings": vectors[0].tolist()})
+    backend = LocalVectorBackend(lambda: collection, refresh_seconds=0)
+    backend.search("u1", {"q": queries[0].tolist()}, top_k)
+    collection.docs += [{"_id": i, "userId": "u1", "embeddings": v.tolist()} for i, v in enumerate(vectors[half:], start=half)]
+    result = backend.search("u1", {"q": queries[0].tolist()}, top_k)["q"]
+    if [d["_id"] for d in result] != [int(i) for i in expected[0]]:
+        failures.append("LocalVectorBackend did not pick up incrementally added transactions")
+    if any(d["_id"] == len(vectors) + 1 for d in result) or "embeddings" in result[0]:
+        failures.append("LocalVectorBackend leaked another user's row or the embeddings field")
+    if backend.stats()["vectors"] != len(vectors):
+        failures.append(f"LocalVectorBackend holds {backend.stats()['vectors']} vectors, expected {len(vectors)}")
+    return failures, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5000, help="transactions for the synthetic user")
+    parser.add_argument("--queries", type=int, default=3, help="focus keywords per search")
+    parser.add_argument("--top-k", type=int, default=80)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    centers, vectors = make_embeddings(args.count)
+    queries = centers[:args.queries] + 0.1 * np.random.default_rng(1).normal(size=(args.queries, EMBEDDING_DIMENSIONS)).astype(np.float32)
+
+    failures, recall = check_correctness(vectors, queries, args.top_k)
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        raise SystemExit(1)
+    print(f"✅ float32 matches brute force, int8 recall@{args.top_k} = {recall:.3f}, incremental load OK\n")
+
+    items = [(i, v, {"_id": i}) for i, v in enumerate(vectors)]
+    print(f"⏱️  {args.count} x {EMBEDDING_DIMENSIONS} vectors, {args.queries} queries, top-{args.top_k}")
+    for dtype in ("float32", "int8"):
+        matrix = VectorMatrix(dtype=dtype)
+        build_s = min(timeit.repeat(lambda: VectorMatrix(dtype=dtype).add(items), number=1, repeat=3))
+        matrix.add(items)
+        search_s = min(timeit.repeat(lambda: matrix.search(queries, args.top_k), number=args.repeat, repeat=3)) / args.repeat
+        print(f"  {dtype:8s} build {build_s * 1000:7.1f} ms   search {search_s * 1000:6.3f} ms   {matrix.nbytes() / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
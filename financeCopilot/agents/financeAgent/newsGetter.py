@@ -1,7 +1,7 @@
 import os
 import json
 import finnhub
-import google.generativeai as genai
+from agents.baseAgent import get_model, call_llm
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
@@ -44,15 +44,13 @@ The JSON should be valid and well-structured.
 
 """
 
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config=self.generation_config,
-            system_instruction=self.role,
-        )
 
         self.finnhub_client = finnhub.Client(api_key=self.finnhub_api_key)
 
+    @property
+    def model(self):
+        return get_model(generation_config=self.generation_config, system_instruction=self.role)
+
     def fetch_top_news(self, symbol: str, limit: int = 30):
         today = datetime.now()
         last_week = today - timedelta(weeks=1)
@@ -92,7 +90,7 @@ News articles:
 {json.dumps(news_list, indent=2)}
 """
 
-        response = self.model.generate_content(prompt)
+        response = call_llm(self.model, prompt, agent="NewsAnalyzer")
 
         try:
             result = json.loads(response.text)
@@ -1,50 +1,58 @@
 import os, sys, json
-import google.generativeai as genai
-from flask import send_file
-from agents.baseAgent import Agent
-from agents.expenseAnalyzerAgent import ExpenseAnalyzerAgent, expenseAnalyzerRole
-from agents.normalChatAgent import NormalChatAgent, normalChatAgentRole
-from agents.orcestratorAgent import Orcestrator, orcestratorAgentRole, agents
-from agents.lifePlannerAgent import LifePlannerAgent, lifePlannerAgentRole
-from agents.budgetPlannerAgent import BudgetPlannerAgent, budgetPlannerAgentRole
-from agents.investmentAdvisorAgent import InvestmentAdvisorAgent, investmentAdvisorAgentRole
-from agents.exportReportAgent import generate_transaction_pdf, generate_budget_pdf
-import asyncio
-from flask import Flask, request, jsonify
+import threading
+import time
+from flask import Blueprint, Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-from agents.job_tracking import job_status
-from flask import Flask, jsonify
-import time
-import yfinance as yf
-import asyncio
-
-
-app = Flask(__name__)
-
-# More permissive CORS configuration
-CORS(
-    app,
-    supports_credentials=True,
-    resources={
-        r"/*": {
-            "origins": "*",
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization", "Accept"],
-            "expose_headers": ["Content-Type", "Authorization"],
-            "supports_credentials": True,
-        }
-    },
-)
-
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
+from agents.baseAgent import configure_genai
+from agents.chat_service import handle_chat, iter_chat_stream, iter_ndjson, run_sync, orchestrator, is_truthy
+from agents.batch_service import handle_batch, stream_batch
+from agents.budgetPlannerAgent import get_budget_planner, preload_category_embeddings
+from agents.embedding_cache import get_embedding_cache
+from agents.job_tracking import job_status, iter_job_events, IDLE_STATUS
+from agents.conversation_memory import user_key_from_form
+from agents.llm_scheduler import llm_scheduler
+from agents.llm_metrics import llm_metrics, PROMETHEUS_CONTENT_TYPE
+from agents.merchant_cache import get_merchant_cache
+from agents.result_cache import get_result_cache
+from agents.ingestion_index import get_transaction_index
+from agents.market_prices import get_current_market_prices_fast
+
+# Ağır bağımlılıklar (yfinance, matplotlib, fpdf, pdfplumber, pymongo, finnhub, numpy,
+# langdetect, google.generativeai) ilgili route veya ajan ilk çalıştığında yüklenir.
+
+
+# Route'lar blueprint'te, uygulama create_app() içinde kurulur. PDF işçi süreçleri (spawn)
+# bu dosyayı __mp_main__ olarak yeniden import ettiğinde uygulama kurulmaz, ön yükleme başlamaz.
+routes = Blueprint("agents", __name__)
+
+
+def create_app():
+    load_dotenv()
+    app = Flask(__name__)
+
+    # More permissive CORS configuration
+    CORS(
+        app,
+        supports_credentials=True,
+        resources={
+            r"/*": {
+                "origins": "*",
+                "methods": ["GET", "POST", "OPTIONS"],
+                "allow_headers": ["Content-Type", "Authorization", "Accept"],
+                "expose_headers": ["Content-Type", "Authorization"],
+                "supports_credentials": True,
+            }
+        },
+    )
+    app.register_blueprint(routes)
 
-orchestrator = Orcestrator("Orchestrator", orcestratorAgentRole)
-budget_planner = BudgetPlannerAgent("BudgetPlannerAgent", budgetPlannerAgentRole)
+    # Kategori embedding'leri arka planda yüklenir; ilk /budget-analysis isteği beklemez
+    threading.Thread(target=preload_category_embeddings, name="embedding-preload", daemon=True).start()
+    return app
 
 
-@app.route("/chat", methods=["POST", "OPTIONS"])
+@routes.route("/chat", methods=["POST", "OPTIONS"])
 def handle_user_input():
     if request.method == "OPTIONS":
         response = jsonify({"status": "ok"})
@@ -57,103 +65,64 @@ def handle_user_input():
         user_text = request.form.get("message")
         uploaded_file = request.files.get("file")
         user = request.form.get("user")
+        job_id = request.form.get("job_id")
 
-        if not user_text and not uploaded_file:
-            return jsonify({"success": False, "message": "Message or file is required"}), 400
-
-
-        track_id = "static-track-id"
-        if track_id in job_status:
-            del job_status[track_id]
-        job_status[track_id] = {"status": "processing", "step": "routing to agent", "user_input": user_text}
-
-        # Step 1: Get orchestrator job decision
-        orchestrator_decision = orchestrator.model.generate_content(user_text)
-        print(f"🧠 Orchestrator decision: {orchestrator_decision.text}")
-
-        decision_json = json.loads(orchestrator_decision.text)
-
-        # Handle Job 1: Routing
-        if decision_json["job"] == "routing":
-            selected_agent_key = decision_json["selected_agent"]
-
-            if selected_agent_key not in agents:
-                return jsonify({"success": False, "message": f"Unknown agent: {selected_agent_key}"}), 400
-
-            print(f"📬 Routing to: {selected_agent_key}")
-            agent = agents[selected_agent_key]
+        # stream=true: NDJSON olarak kısmi alanlar + son yanıt
+        if is_truthy(request.form.get("stream") or request.args.get("stream")):
+            if not user_text and not uploaded_file:
+                return jsonify({"success": False, "message": "Message or file is required"}), 400
+            return Response(
+                stream_with_context(iter_chat_stream(user_text, uploaded_file, user, job_id)),
+                mimetype="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
 
-            # Handle file input (only valid for expenseAnalyzerAgent)
-            if selected_agent_key == "expenseanalyzeragent":
-                if uploaded_file and uploaded_file.filename:
-                    result = agent.categorize_pdf(uploaded_file)
-                else:
-                    return jsonify({"success": False, "message": "Please upload a PDF file for analysis"}), 400
+        body, status = run_sync(handle_chat(user_text, uploaded_file, user, job_id))
+        return jsonify(body), status
 
-            # Handle async agents
-            elif selected_agent_key == "lifeplanneragent":
-                result = asyncio.run(agent.get_life_plan(user_text, user))
-
-            elif selected_agent_key == "investmentadvisoragent":
-                result = asyncio.run(agent.get_financal_advise(user_text, user))
-
-            # Handle synchronous agents
-            else:
-                result = agent.generate_response(user_text)
-
-            # Save history
-            orchestrator.conversation_history.append({
-                "user_input": user_text,
-                "agent_key": selected_agent_key,
-                "agent_response": result
-            })
-
-            # Step 2: Get final natural language response from orchestrator
-            final_response = orchestrator.generate_final_response(user_text, result)
-            print(f"📦 Raw orchestrator response: {final_response}")
-
-            if not final_response:
-                return jsonify({"success": False, "message": "Orchestrator failed to generate final response"}), 500
-
-            try:
-                if isinstance(final_response, str):
-                    parsed_response = json.loads(final_response)
-                else:
-                    parsed_response = final_response
-
-                agent_resp = parsed_response.get("agent_response")
-                if isinstance(agent_resp, str):
-                    extra_parsed = json.loads(agent_resp)
-                else:
-                    extra_parsed = agent_resp
-            except Exception as parse_err:
-                print(f"🧨 JSON parse error: {parse_err}")
-                print(f"📝 Raw final_response: {final_response}")
-                return jsonify({
-                    "success": False,
-                    "message": "Final response could not be parsed",
-                    "error": str(parse_err),
-                }), 500
+    except Exception as e:
+        print(f"Error in handle_user_input: {e}")
+        return jsonify({
+            "success": False,
+            "message": "An error occurred while processing your request",
+            "error": str(e),
+        }), 500
 
-            return jsonify({"success": True, "response": extra_parsed})
+# Birden fazla ekstre: yönlendirme yapılmadan doğrudan harcama analizine gider
+@routes.route("/analyze-statements", methods=["POST", "OPTIONS"])
+def handle_statement_batch():
+    if request.method == "OPTIONS":
+        response = jsonify({"status": "ok"})
+        response.headers.add("Access-Control-Allow-Origin", "*")
+        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
+        response.headers.add("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
+        return response
 
+    try:
+        uploaded_files = request.files.getlist("files")
+        user = request.form.get("user")
+        job_id = request.form.get("job_id")
 
-        # Handle Job 2: Already in natural language
-        elif decision_json["job"] == "transporting":
-            return jsonify({"success": True, "response": decision_json["transporting"]})
+        # stream=true: her dosyanın sonucu bittiği anda NDJSON satırı olarak gönderilir
+        if is_truthy(request.form.get("stream") or request.args.get("stream")):
+            return Response(
+                stream_with_context(iter_ndjson(stream_batch(uploaded_files, user, job_id))),
+                mimetype="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
 
-        else:
-            return jsonify({"success": False, "message": "Invalid job type from orchestrator"}), 400
+        body, status = run_sync(handle_batch(uploaded_files, user, job_id))
+        return jsonify(body), status
 
     except Exception as e:
-        print(f"Error in handle_user_input: {e}")
+        print(f"Error in handle_statement_batch: {e}")
         return jsonify({
             "success": False,
             "message": "An error occurred while processing your request",
             "error": str(e),
         }), 500
 
-@app.route("/budget-analysis", methods=["POST", "OPTIONS"])
+@routes.route("/budget-analysis", methods=["POST", "OPTIONS"])
 def handle_budget_analysis():
     """
     Endpoint to handle budget analysis requests.
@@ -171,7 +140,7 @@ def handle_budget_analysis():
         if not userId:
             return jsonify({"success": False, "message": "userId is required"}), 400
 
-        result = budget_planner.run_budget_analysis(userId)
+        result = get_budget_planner().run_budget_analysis(userId)
 
         if not result:
             return jsonify({"success": False, "message": "No data available for analysis"}), 404
@@ -187,7 +156,7 @@ def handle_budget_analysis():
         }), 500
 
 
-@app.route("/embeddings", methods=["POST"])
+@routes.route("/embeddings", methods=["POST"])
 def get_embeddings():
     try:
         data = request.get_json()
@@ -196,6 +165,8 @@ def get_embeddings():
         if not text:
             return jsonify({"success": False, "message": "Text is required"}), 400
 
+        import google.generativeai as genai
+        configure_genai()
         result = genai.embed_content(
             model="models/embedding-001",
             content=text,
@@ -213,57 +184,70 @@ def get_embeddings():
         }), 500
 
 # New endpoint: Get job status
-@app.route("/job-status/<job_id>", methods=["GET"])
+# Bir kullanıcıya ait işler yalnızca aynı kullanıcıya (?user=<id>) gösterilir
+@routes.route("/job-status/<job_id>", methods=["GET"])
 def get_job_status(job_id):
-    job = job_status.get(job_id)
+    job = job_status.get(job_id, requester=user_key_from_form(request.args.get("user")))
     if not job:
-        return jsonify({
-            "success": True,
-            "status": {
-                "status": "idle",
-                "step": "waiting for input"
-            }
-        })
+        return jsonify({"success": True, "status": IDLE_STATUS})
     return jsonify({"success": True, "status": job})
 
 
+# Server-Sent Events: adım değişikliklerini istemciye iter, polling gerekmez
+@routes.route("/job-status/<job_id>/stream", methods=["GET"])
+def stream_job_status(job_id):
+    return Response(
+        stream_with_context(iter_job_events(job_id, requester=user_key_from_form(request.args.get("user")))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+@routes.route("/router-stats", methods=["GET"])
+def get_router_stats():
+    return jsonify({"success": True, "stats": orchestrator.intent_router.stats(), "transport": orchestrator.transport_stats()})
+
 
-@app.route("/export-transaction", methods=["POST"])
+@routes.route("/llm-stats", methods=["GET"])
+def get_llm_stats():
+    return jsonify({"success": True, "scheduler": llm_scheduler.stats()})
+
+
+@routes.route("/cache-stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({
+        "success": True,
+        "merchant_categories": get_merchant_cache().stats(),
+        "statement_results": get_result_cache().stats(),
+        "ingested_transactions": get_transaction_index().stats(),
+        "embeddings": get_embedding_cache().stats(),
+        "vector_index": get_budget_planner().vector_backend.stats(),
+    })
+
+
+@routes.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(llm_metrics.render(llm_scheduler.stats()), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+
+@routes.route("/export-transaction", methods=["POST"])
 def transaction_export():
+    from agents.exportReportAgent import generate_transaction_pdf
+
     data = request.get_json()
     path = generate_transaction_pdf(data)
     return send_file(path, as_attachment=True)
 
-@app.route("/export-budget", methods=["POST"])
+@routes.route("/export-budget", methods=["POST"])
 def budget_export():
+    from agents.exportReportAgent import generate_budget_pdf
+
     data = request.get_json()
     path = generate_budget_pdf(data)
     return send_file(path, as_attachment=True)
 
-def get_current_market_prices_fast(file_path: str):
-    with open(file_path, "r") as f:
-        symbols = [line.strip() for line in f if line.strip()]
-
-    data = yf.download(
-        tickers=" ".join(symbols),
-        period="1d",
-        interval="1m",  
-        group_by="ticker",
-        threads=True,
-        progress=False
-    )
-
-    results = []
-    for symbol in symbols:
-        try:
-            last_price = data[symbol]["Close"].dropna().iloc[-1]
-            results.append(f"{symbol}: {last_price:.2f} $")
-        except Exception:
-            results.append(f"{symbol}: Price not available")
-
-    return results
-
-@app.route("/market-prices", methods=["GET"])
+@routes.route("/market-prices", methods=["GET"])
 def fetch_market_prices():
     start = time.time()
     prices = get_current_market_prices_fast("./agents/financeAgent/sp500_symbols.txt")
@@ -280,7 +264,7 @@ def fetch_market_prices():
 
 import base64
 
-@app.route("/test-export-transaction-preview", methods=["POST"])
+@routes.route("/test-export-transaction-preview", methods=["POST"])
 def test_transaction_preview():
     data = request.get_json()
     path = generate_transaction_pdf(data)
@@ -298,5 +282,5 @@ def test_transaction_preview():
 
 if __name__ == "__main__":
     print("Starting Flask server on port 5001...")
-    app.run(debug=True, port=5001, host="0.0.0.0")
+    create_app().run(debug=True, port=5001, host="0.0.0.0")
 
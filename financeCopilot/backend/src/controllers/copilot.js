@@ -4,7 +4,7 @@ const financeCopilotUrl = "http://localhost:5001";
 
 exports.sendMessageToCopilot = async (req, res) => {
   try {
-    const { message } = req.body;
+    const { message, job_id } = req.body;
     const file = req.file;
 
     if (!message && !file) {
@@ -16,6 +16,7 @@ exports.sendMessageToCopilot = async (req, res) => {
 
     const formData = new FormData();
     if (message) formData.append("message", message);
+    if (job_id) formData.append("job_id", job_id);
     if (file) {
       formData.append("file", file.buffer, {
         filename: file.originalname,
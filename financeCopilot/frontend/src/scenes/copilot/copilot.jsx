@@ -1,4 +1,4 @@
-import React, { useState, useRef, useEffect } from "react";
+import React, { useState, useRef, useEffect, useContext } from "react";
 import {
   Box,
   Typography,
@@ -31,8 +31,10 @@ import {
   resolveUrl,
 } from "../../util/api";
 import { tokens } from "../../theme";
+import { AuthContext } from "../../context/AuthContext";
 
 const Copilot = () => {
+  const { user } = useContext(AuthContext);
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
@@ -50,6 +52,7 @@ const Copilot = () => {
   const lastDisplayedIndexRef = useRef(0);
   const [trackingActive, setTrackingActive] = useState(false);
   const [tokenCost, setTokenCost] = useState(null);
+  const [jobId, setJobId] = useState(null);
 
   const messagesEndRef = useRef(null);
   const fileInputRef = useRef(null);
@@ -66,51 +69,51 @@ const Copilot = () => {
     ]);
   }, []);
 
-  // Polling static job status for tracking step
+  // Subscribe to this request's job status stream (Server-Sent Events)
   useEffect(() => {
-    if (!trackingActive) return;
+    if (!trackingActive || !jobId) return;
 
-    const interval = setInterval(async () => {
+    // Jobs are bound to the requesting user; the agents service only streams them back to that user
+    const userQuery = user?.id ? `?user=${encodeURIComponent(user.id)}` : "";
+    const source = new EventSource(
+      `http://localhost:5001/job-status/${jobId}/stream${userQuery}`
+    );
+
+    source.onmessage = (event) => {
       try {
-        const res = await fetch(
-          "http://localhost:5001/job-status/static-track-id"
-        );
-        const data = await res.json();
-        console.log("Polling data:", data); // Debug log
-        if (data?.success) {
-          if (data.status?.step) {
-            setTrackingStep(data.status.step);
-          }
-          if (Array.isArray(data.status?.steps)) {
-            // Deduplicate and accumulate step history
-            setCustomStepHistory((prev) => {
-              // Combine existing and new, deduplicate
-              const newSteps = data.status.steps.filter(
-                (step) => !prev.includes(step)
-              );
-              return [...prev, ...newSteps];
-            });
-          }
-          if (data.status?.cost) {
-            setTokenCost(data.status.cost);
-          }
+        const status = JSON.parse(event.data);
+        if (status?.step) {
+          setTrackingStep(status.step);
+        }
+        if (Array.isArray(status?.steps)) {
+          // Deduplicate and accumulate step history
+          setCustomStepHistory((prev) => {
+            const newSteps = status.steps.filter(
+              (step) => !prev.includes(step)
+            );
+            return [...prev, ...newSteps];
+          });
+        }
+        if (status?.cost) {
+          setTokenCost(status.cost);
         }
 
         if (
-          data?.status?.status === "done" ||
-          data?.status?.status === "failed"
+          status?.status === "done" ||
+          status?.status === "failed" ||
+          status?.status === "idle"
         ) {
-          clearInterval(interval);
+          source.close();
           setTrackingStep(null);
           setTrackingActive(false);
         }
       } catch (err) {
-        console.error("Polling error:", err);
+        console.error("Job status stream error:", err);
       }
-    }, 750);
+    };
 
-    return () => clearInterval(interval);
-  }, [trackingActive]);
+    return () => source.close();
+  }, [trackingActive, jobId, user?.id]);
 
   // Gradually reveal steps in process tracker
   useEffect(() => {
@@ -156,9 +159,11 @@ const Copilot = () => {
       setCustomStepHistory([]);
       setVisibleSteps([]);
       setTrackingStep(null);
-      setTrackingActive(true);
       setTokenCost(null);
-      const response = await sendCopilotMessage(input, selectedFile);
+      const newJobId = crypto.randomUUID();
+      setJobId(newJobId);
+      setTrackingActive(true);
+      const response = await sendCopilotMessage(input, selectedFile, newJobId);
       console.log("Response from backend:", response);
 
       let botMsg;
@@ -149,11 +149,12 @@ export function editSurvey(surveyData) {
   return editSurveyFields(surveyData);
 }
 
-async function sendMessageToCopilot(message, file) {
+async function sendMessageToCopilot(message, file, jobId) {
   try {
     const formData = new FormData();
     if (message) formData.append("message", message);
     if (file) formData.append("file", file);
+    if (jobId) formData.append("job_id", jobId);
 
     const response = await axiosInstance.post(`/copilot/chat`, formData, {
       headers: {
@@ -173,8 +174,8 @@ async function sendMessageToCopilot(message, file) {
   }
 }
 
-export function sendCopilotMessage(message, file) {
-  return sendMessageToCopilot(message, file);
+export function sendCopilotMessage(message, file, jobId) {
+  return sendMessageToCopilot(message, file, jobId);
 }
 
 async function saveTransactionsAndSpending(